@@ -1,11 +1,13 @@
 from fastapi import APIRouter, HTTPException, status, Query, Path, Depends
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from pydantic import UUID4
 from ....schemas.food import FoodCreate, FoodResponse, FoodUpdate, FoodCategory, FoodType
 from ....schemas.user import DietaryRequirement
-from ...v1.endpoints.users import get_current_user
-from ....core.supabase import execute_query
+from ...v1.endpoints.users import get_current_user, get_current_user_fresh
+from ....core.supabase import execute_query, contains_pattern
+from ....services.food_service import invalidate_available_foods_context
+from ....services.swap_service import invalidate_nearby_swaps
 
 router = APIRouter(tags=["foods"])
 
@@ -31,9 +33,9 @@ async def create_food(
     user_id = current_user["id"]
     
     # Create food in database
-    now = datetime.now().isoformat()
+    now = datetime.now(timezone.utc)
     food_data = {
-        **food.model_dump(),
+        **food.model_dump(mode="json"),
         "user_id": user_id,
         "created_at": now,
         "updated_at": now
@@ -59,6 +61,9 @@ async def create_food(
             detail="Failed to create food listing"
         )
     
+    await invalidate_available_foods_context()
+    await invalidate_nearby_swaps()
+    
     return new_food[0]
 
 @router.get("/", response_model=List[FoodResponse])
@@ -104,56 +109,33 @@ async def get_foods(
     if is_homemade is not None:
         filters["is_homemade"] = is_homemade
     
-    # Get foods from database
-    foods = await execute_query(
-        table="foods",
-        query_type="select",
-        filters=filters,
-        limit=limit
-    )
-    
-    # Apply additional filtering that can't be done directly in the query
-    filtered_foods = foods
-    
-    # Filter by dietary requirement
     if dietary_requirement:
-        filtered_foods = [
-            food for food in filtered_foods 
-            if dietary_requirement.value in food["dietary_requirements"]
-        ]
+        filters["dietary_requirements"] = {"cs": [dietary_requirement.value]}
     
-    # Filter by location
     if location:
-        filtered_foods = [
-            food for food in filtered_foods 
-            if location.lower() in food["location"].lower()
-        ]
+        filters["location"] = {"ilike": contains_pattern(location)}
     
-    # Filter by allergen-free
     if allergen_free:
-        allergen_free_lower = allergen_free.lower()
-        filtered_foods = [
-            food for food in filtered_foods 
-            if allergen_free_lower not in food["allergens"].lower()
-        ]
+        filters["allergens"] = {"not_ilike": contains_pattern(allergen_free)}
     
-    # Filter by search term
     if search:
-        search = search.lower()
-        filtered_foods = [
-            food for food in filtered_foods 
-            if search in food["title"].lower() or search in food["description"].lower()
-        ]
+        filters["or"] = {
+            "title": {"ilike": contains_pattern(search)},
+            "description": {"ilike": contains_pattern(search)}
+        }
     
-    # Filter by maximum tickets required
     if max_tickets is not None:
-        filtered_foods = [
-            food for food in filtered_foods 
-            if food.get("tickets_required", 1) <= max_tickets
-        ]
+        filters["tickets_required"] = {"lte": max_tickets}
     
-    # Skip the first 'skip' foods
-    return filtered_foods[skip:skip + limit]
+    # Every filter runs in the query, so the database applies skip and limit
+    # to the matching rows and only the requested page comes back
+    return await execute_query(
+        table="foods",
+        query_type="select",
+        filters=filters,
+        limit=limit,
+        offset=skip
+    )
 
 @router.get("/nearby", response_model=List[FoodResponse])
 async def get_nearby_foods(
@@ -180,36 +162,23 @@ async def get_nearby_foods(
     if category:
         filters["category"] = category.value
     
-    # Get foods from database
-    foods = await execute_query(
-        table="foods",
-        query_type="select",
-        filters=filters
-    )
-    
-    # Filter by location (simple string matching for demo)
-    filtered_foods = [
-        food for food in foods 
-        if location.lower() in food["location"].lower()
-    ]
+    # Match the location string (simple string matching for demo)
+    filters["location"] = {"ilike": contains_pattern(location)}
     
-    # Filter by dietary requirement
     if dietary_requirement:
-        filtered_foods = [
-            food for food in filtered_foods 
-            if dietary_requirement.value in food["dietary_requirements"]
-        ]
+        filters["dietary_requirements"] = {"cs": [dietary_requirement.value]}
     
-    # Filter by allergen-free
     if allergen_free:
-        allergen_free_lower = allergen_free.lower()
-        filtered_foods = [
-            food for food in filtered_foods 
-            if allergen_free_lower not in food["allergens"].lower()
-        ]
+        filters["allergens"] = {"not_ilike": contains_pattern(allergen_free)}
     
-    # Skip the first 'skip' foods
-    return filtered_foods[skip:skip + limit]
+    # Get only the requested page of matching foods from the database
+    return await execute_query(
+        table="foods",
+        query_type="select",
+        filters=filters,
+        limit=limit,
+        offset=skip
+    )
 
 @router.get("/foods", response_model=List[FoodResponse])
 async def get_foods_special():
@@ -277,8 +246,8 @@ async def update_food(
         )
     
     # Update food in database
-    update_data = food_update.model_dump(exclude_unset=True)
-    update_data["updated_at"] = datetime.now().isoformat()
+    update_data = food_update.model_dump(mode="json", exclude_unset=True)
+    update_data["updated_at"] = datetime.now(timezone.utc)
     
     updated_food = await execute_query(
         table="foods",
@@ -293,6 +262,9 @@ async def update_food(
             detail="Failed to update food listing"
         )
     
+    await invalidate_available_foods_context()
+    await invalidate_nearby_swaps()
+    
     return updated_food[0]
 
 @router.delete("/{food_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -329,9 +301,13 @@ async def delete_food(
     await execute_query(
         table="foods",
         query_type="delete",
-        filters={"id": str(food_id)}
+        filters={"id": str(food_id)},
+        return_representation=False
     )
     
+    await invalidate_available_foods_context()
+    await invalidate_nearby_swaps()
+    
     return None
 
 @router.get("/user/{user_id}", response_model=List[FoodResponse])
@@ -411,7 +387,7 @@ async def fulfill_food_request(
         )
     
     # Update food request status
-    now = datetime.now().isoformat()
+    now = datetime.now(timezone.utc)
     updated_food = await execute_query(
         table="foods",
         query_type="update",
@@ -430,6 +406,9 @@ async def fulfill_food_request(
             detail="Failed to update food request"
         )
     
+    await invalidate_available_foods_context()
+    await invalidate_nearby_swaps()
+    
     # Create fulfillment record
     fulfillment_data = {
         "food_id": str(food_id),
@@ -444,7 +423,8 @@ async def fulfill_food_request(
     await execute_query(
         table="food_fulfillments",
         query_type="insert",
-        data=fulfillment_data
+        data=fulfillment_data,
+        return_representation=False
     )
     
     # Create notification for the requester
@@ -462,7 +442,8 @@ async def fulfill_food_request(
     await execute_query(
         table="notifications",
         query_type="insert",
-        data=notification_data
+        data=notification_data,
+        return_representation=False
     )
     
     return updated_food[0]
@@ -470,7 +451,7 @@ async def fulfill_food_request(
 @router.get("/search/personalized", response_model=List[FoodResponse])
 async def search_personalized_foods(
     search_term: Optional[str] = Query(None, min_length=2),
-    current_user: dict = Depends(get_current_user),
+    current_user: dict = Depends(get_current_user_fresh),
     food_type: Optional[FoodType] = None,
     category: Optional[FoodCategory] = None,
     max_distance: float = Query(5.0, gt=0),  # Default 5km radius
@@ -590,7 +571,7 @@ async def search_personalized_foods(
 @router.get("/search/requests", response_model=List[FoodResponse])
 async def search_food_requests(
     search_term: Optional[str] = Query(None, min_length=2),
-    current_user: dict = Depends(get_current_user),
+    current_user: dict = Depends(get_current_user_fresh),
     category: Optional[FoodCategory] = None,
     min_tickets: Optional[int] = None,
     max_distance: float = Query(5.0, gt=0),
@@ -707,7 +688,7 @@ async def search_food_requests(
 
 @router.get("/recommendations", response_model=List[FoodResponse])
 async def get_food_recommendations(
-    current_user: dict = Depends(get_current_user),
+    current_user: dict = Depends(get_current_user_fresh),
     limit: int = Query(10, ge=1, le=20),
     include_requests: bool = Query(False)
 ):
@@ -786,6 +767,7 @@ async def get_food_recommendations(
     # Score and rank recommendations
     scored_recommendations = []
     
+    now = datetime.now(timezone.utc)
     for food in potential_recommendations:
         # Skip if the food contains allergens the user is allergic to
         if user_allergies:
@@ -826,7 +808,6 @@ async def get_food_recommendations(
         if food.get("created_at"):
             try:
                 created_at = datetime.fromisoformat(food["created_at"].replace("Z", "+00:00"))
-                now = datetime.now()
                 age_hours = (now - created_at).total_seconds() / 3600
                 
                 if age_hours < 24:
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Path, Query
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from pydantic import BaseModel, UUID4
 from enum import Enum
 from ....core.supabase import execute_query, execute_raw_sql
@@ -64,11 +64,11 @@ async def get_notifications(
         query_type="select",
         filters=filters,
         order_by={"created_at": "desc"},
-        limit=limit
+        limit=limit,
+        offset=skip
     )
     
-    # Skip the first 'skip' notifications
-    return notifications[skip:skip + limit]
+    return notifications
 
 @router.patch("/{notification_id}", response_model=NotificationResponse)
 async def mark_notification(
@@ -186,7 +186,8 @@ async def delete_notification(
     await execute_query(
         table="notifications",
         query_type="delete",
-        filters={"id": str(notification_id)}
+        filters={"id": str(notification_id)},
+        return_representation=False
     )
     
     return None
@@ -203,8 +204,8 @@ async def create_notification(
     
     # Create notification in database
     notification_data = {
-        **notification.model_dump(),
-        "created_at": datetime.now().isoformat()
+        **notification.model_dump(mode="json"),
+        "created_at": datetime.now(timezone.utc)
     }
     
     new_notification = await execute_query(
@@ -259,12 +260,8 @@ async def create_nearby_food_notifications(
         SELECT id
         FROM users
         WHERE id != %s
-        AND location IS NOT NULL
         AND ST_DWithin(
-            ST_SetSRID(ST_MakePoint(
-                (location->>'longitude')::float,
-                (location->>'latitude')::float
-            ), 4326)::geography,
+            geog,
             ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography,
             %s
         )
@@ -302,44 +299,46 @@ async def create_nearby_food_notifications(
         if not foods_result or "data" not in foods_result or len(foods_result["data"]) == 0:
             return {"message": "No new nearby foods found"}
         
-        # Check if notifications already exist for these foods
-        notifications_created = 0
+        # Skip foods the user was already notified about
+        foods = foods_result["data"]
+        existing_notifications = await execute_query(
+            table="notifications",
+            query_type="select",
+            filters={
+                "user_id": current_user["id"],
+                "type": "nearby_food",
+                "related_id": {"in": [food["id"] for food in foods]}
+            },
+            select="related_id"
+        )
+        notified_food_ids = {notification["related_id"] for notification in existing_notifications or []}
         
-        for food in foods_result["data"]:
-            # Check if notification already exists
-            existing_notification = await execute_query(
-                table="notifications",
-                query_type="select",
-                filters={
-                    "user_id": current_user["id"],
-                    "type": "nearby_food",
-                    "related_id": food["id"]
-                }
-            )
-            
-            if existing_notification and len(existing_notification) > 0:
-                # Notification already exists, skip
-                continue
-            
-            # Create notification
-            notification_data = {
+        # Create all new notifications with a single insert
+        now = datetime.now(timezone.utc)
+        new_notifications = [
+            {
                 "user_id": current_user["id"],
                 "type": "nearby_food",
                 "title": "New Food Nearby",
                 "message": f"{food['first_name']} {food['last_name']} added {food['name']} near you!",
                 "related_id": food["id"],
                 "is_read": False,
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
+                "created_at": now,
+                "updated_at": now
             }
-            
+            for food in foods
+            if food["id"] not in notified_food_ids
+        ]
+        
+        if new_notifications:
             await execute_query(
                 table="notifications",
                 query_type="insert",
-                data=notification_data
+                data=new_notifications,
+                return_representation=False
             )
-            
-            notifications_created += 1
+        
+        notifications_created = len(new_notifications)
         
         return {
             "message": f"Created {notifications_created} new notifications for nearby foods",
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Path, Query
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from pydantic import BaseModel, UUID4, Field
 from ....core.supabase import execute_query
 from ...v1.endpoints.users import get_current_user
@@ -82,10 +82,10 @@ async def create_rating(
     
     # Create rating in database
     rating_data = {
-        **rating.model_dump(),
+        **rating.model_dump(mode="json"),
         "rater_id": rater_id,
         "rated_user_id": rated_user_id,
-        "created_at": datetime.now().isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
     
     new_rating = await execute_query(
@@ -117,11 +117,11 @@ async def get_user_ratings(
         query_type="select",
         filters={"rated_user_id": str(user_id)},
         order_by={"created_at": "desc"},
-        limit=limit
+        limit=limit,
+        offset=skip
     )
     
-    # Skip the first 'skip' ratings
-    return ratings[skip:skip + limit]
+    return ratings
 
 @router.get("/swap/{swap_id}", response_model=List[RatingResponse])
 async def get_swap_ratings(
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
-from typing import Optional, Dict, Any, List
+from fastapi.responses import ORJSONResponse, Response
+from typing import Optional, Dict, Any, List, Tuple
 from uuid import UUID
 import logging
-import json
+import asyncio
+import hashlib
+import orjson
 import tempfile
 import os
-from pydantic import BaseModel
+import aiofiles
+import aiofiles.os
 
 from ....schemas.recommendation import (
     RecommendationRequest,
@@ -18,23 +22,181 @@ from ....schemas.recommendation import (
 )
 from ....core.datastax import (
     get_food_recommendations,
+    get_food_recommendations_anon,
     save_user_profile
 )
 from ....services.langflow_service import get_ai_food_recommendations
 from ....services.dr_foodlove_service import get_dr_foodlove_recommendations
-from ...v1.endpoints.users import get_current_user
+from ....services.food_service import get_available_foods_context, FOOD_DETAIL_COLUMNS
+from ...v1.endpoints.users import get_current_user, get_current_user_fresh, get_optional_current_user
 from ....core.supabase import execute_query
+from ....core.cache import cache_get_bytes, cache_set_bytes
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["recommendations"])
 
+# Uploaded images are copied to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1 << 20
 
-@router.post("/search", response_model=RecommendationResponse)
+# AI responses are cached briefly so repeated queries skip the LLM call
+AI_RESPONSE_CACHE_TTL = 300
+IMAGE_RESPONSE_CACHE_TTL = 3600
+
+
+def _ai_cache_key(prefix: str, *parts: Any) -> str:
+    """
+    Hash the inputs of an AI call into a cache key.
+    
+    Dict keys are sorted, so the same preferences always hash the same. The
+    preferences carry the user's id, which keeps users' entries apart.
+    """
+    digest = hashlib.blake2b(
+        orjson.dumps(parts, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS),
+        digest_size=16
+    ).hexdigest()
+    return f"{prefix}:{digest}"
+
+
+def _json_bytes_response(body: bytes) -> Response:
+    """Return already-serialized JSON without encoding it again."""
+    return Response(content=body, media_type="application/json")
+
+
+def _hash_file(file) -> str:
+    """Hash a file object in chunks, then rewind it so it can be read again."""
+    hasher = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: file.read(UPLOAD_CHUNK_SIZE), b""):
+        hasher.update(chunk)
+    file.seek(0)
+    return hasher.hexdigest()
+
+
+def _user_prefs_from(current_user: dict, extra_keys: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    """Build the user preferences dict sent to the AI services."""
+    user_preferences = {
+        "user_id": current_user["id"],
+        "name": current_user.get("full_name", ""),
+        "email": current_user.get("email", ""),
+        "dietary_restrictions": current_user.get("dietary_restrictions", []),
+        "allergies": current_user.get("allergies", []),
+        "cuisine_preferences": current_user.get("cuisine_preferences", [])
+    }
+    for key in extra_keys:
+        user_preferences[key] = current_user.get(key, [])
+    return user_preferences
+
+
+def _resolve_preferences(
+    current_user: Optional[dict],
+    include_user_preferences: bool,
+    custom_preferences: Optional[Dict[str, Any]] = None,
+    extra_keys: Tuple[str, ...] = ()
+) -> Optional[Dict[str, Any]]:
+    """
+    Work out the preferences to send to the AI services.
+    
+    The user's profile is used when requested and the user is authenticated,
+    with any custom preferences layered on top. Otherwise only the custom
+    preferences are used, if any.
+    """
+    if include_user_preferences and current_user:
+        user_preferences = _user_prefs_from(current_user, extra_keys)
+        if custom_preferences:
+            user_preferences.update(custom_preferences)
+        return user_preferences
+    return custom_preferences or None
+
+
+async def _hydrate_recommendations(recommendations: List[Dict[str, Any]]) -> None:
+    """
+    Attach the database row for every recommendation that carries a food_id.
+
+    All ids are looked up in a single query rather than one query per item.
+    """
+    food_ids = list({str(rec["food_id"]) for rec in recommendations if rec.get("food_id")})
+    if not food_ids:
+        return
+    
+    try:
+        rows = await execute_query(
+            table="foods",
+            query_type="select",
+            filters={"id": {"in": food_ids}},
+            select=FOOD_DETAIL_COLUMNS
+        )
+    except Exception:
+        logger.exception("Error fetching food details for IDs %s", food_ids)
+        return
+    
+    foods_by_id = {str(row["id"]): row for row in rows}
+    for rec in recommendations:
+        food = foods_by_id.get(str(rec.get("food_id")))
+        if food:
+            rec["database_item"] = food
+
+
+async def _fetch_food_item(item_id: Optional[UUID]) -> Optional[Dict[str, Any]]:
+    """Fetch a single food by id, or None if it is missing or the lookup fails."""
+    if not item_id:
+        return None
+    
+    try:
+        food_items = await execute_query(
+            table="foods",
+            query_type="select",
+            filters={"id": str(item_id)},
+            select=FOOD_DETAIL_COLUMNS
+        )
+    except Exception:
+        logger.exception("Error fetching food item")
+        # Continue with the request even if food item fetch fails
+        return None
+    
+    return food_items[0] if food_items else None
+
+
+async def _finalize(
+    cache_key: str,
+    recommendations: Dict[str, Any],
+    ttl: int = AI_RESPONSE_CACHE_TTL
+) -> Response:
+    """
+    Hydrate food ids, serialize the result once, and cache it if it succeeded.
+    """
+    # If recommendations include food IDs from our database, fetch the full details
+    if recommendations.get("success") and recommendations.get("recommendations"):
+        await _hydrate_recommendations(recommendations["recommendations"])
+    
+    body = orjson.dumps(recommendations, option=orjson.OPT_NON_STR_KEYS)
+    if recommendations.get("success"):
+        await cache_set_bytes(cache_key, body, ttl)
+    return _json_bytes_response(body)
+
+
+async def _search_anon(search_term: str, limit: int) -> ORJSONResponse:
+    """
+    Fast path for anonymous searches.
+
+    There are no preferences to apply, so the result goes straight from the
+    prepared DataStax statements to the client without re-validating it
+    against the response model.
+    """
+    recommendations = await get_food_recommendations_anon(search_term=search_term, limit=limit)
+    return ORJSONResponse(content=recommendations)
+
+
+# The AI and search endpoints return dicts built from trusted upstream data,
+# so they skip response_model validation and document the schema instead
+@router.post(
+    "/search",
+    response_class=ORJSONResponse,
+    responses={200: {"model": RecommendationResponse}}
+)
 async def search_food_recommendations(
     request: RecommendationRequest,
-    current_user: Optional[dict] = Depends(get_current_user)
+    current_user: Optional[dict] = Depends(get_optional_current_user)
 ):
     """
     Search for food recommendations based on a search term.
@@ -42,20 +204,19 @@ async def search_food_recommendations(
     If a user is authenticated, their preferences will be considered in the recommendations.
     """
     try:
-        user_id = None
-        if current_user:
-            user_id = UUID(current_user["id"])
+        if current_user is None:
+            return await _search_anon(request.search_term, request.limit)
         
         # Get recommendations from DataStax
         recommendations = await get_food_recommendations(
             search_term=request.search_term,
-            user_id=user_id,
+            user_id=current_user["_uuid"],
             limit=request.limit
         )
         
-        return recommendations
-    except Exception as e:
-        logger.error(f"Error getting food recommendations: {e}")
+        return ORJSONResponse(content=recommendations)
+    except Exception:
+        logger.exception("Error getting %s recommendations", "food")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get food recommendations"
@@ -92,18 +253,22 @@ async def update_food_preferences(
         return {"message": "Food preferences updated successfully"}
     except HTTPException:
         raise
-    except Exception as e:
-        logger.error(f"Error updating food preferences: {e}")
+    except Exception:
+        logger.exception("Error updating food preferences")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update food preferences"
         )
 
 
-@router.post("/ai-recommendations", response_model=AIRecommendationResponse)
+@router.post(
+    "/ai-recommendations",
+    response_class=ORJSONResponse,
+    responses={200: {"model": AIRecommendationResponse}}
+)
 async def get_ai_recommendations(
     request: AIRecommendationRequest,
-    current_user: Optional[dict] = Depends(get_current_user)
+    current_user: Optional[dict] = Depends(get_current_user_fresh)
 ):
     """
     Get AI-powered food recommendations using DataStax Langflow.
@@ -111,97 +276,36 @@ async def get_ai_recommendations(
     This endpoint can use the authenticated user's preferences to enhance recommendations.
     """
     try:
-        # Get user preferences if requested and user is authenticated
-        user_preferences: Optional[Dict[str, Any]] = None
-        
-        if request.include_user_preferences and current_user:
-            # Get user preferences from database
-            user_id = UUID(current_user["id"])
-            
-            # Construct user preferences dictionary
-            # This would typically come from your database
-            # For now, we'll use a simplified version based on the current user data
-            user_preferences = {
-                "user_id": str(user_id),
-                "name": current_user.get("full_name", ""),
-                "email": current_user.get("email", ""),
-                # Add any other preferences from your user profile
-                "dietary_restrictions": current_user.get("dietary_restrictions", []),
-                "allergies": current_user.get("allergies", []),
-                "cuisine_preferences": current_user.get("cuisine_preferences", [])
-            }
+        user_preferences = _resolve_preferences(current_user, request.include_user_preferences)
         
-        # Fetch available foods from the database to provide context to the AI
-        available_foods = []
-        try:
-            # Get a sample of available foods from the database
-            foods_result = await execute_query(
-                table="foods",
-                query_type="select",
-                filters={"is_available": True},
-                limit=50  # Limit to 50 foods to avoid token limits
-            )
-            
-            if foods_result and len(foods_result) > 0:
-                # Extract relevant information from each food
-                available_foods = [
-                    {
-                        "name": food.get("title", ""),
-                        "description": food.get("description", ""),
-                        "category": food.get("category", ""),
-                        "dietary_requirements": food.get("dietary_requirements", []),
-                        "allergens": food.get("allergens", []),
-                        "id": str(food.get("id", ""))
-                    }
-                    for food in foods_result
-                ]
-                
-                logger.info(f"Fetched {len(available_foods)} available foods for AI context")
-            else:
-                logger.warning("No available foods found in the database")
-        except Exception as e:
-            logger.error(f"Error fetching available foods: {e}")
-            # Continue without available foods if there's an error
+        cache_key = _ai_cache_key("aireco", request.query, user_preferences, request.limit)
+        cached = await cache_get_bytes(cache_key)
+        if cached is not None:
+            return _json_bytes_response(cached)
         
-        # Get AI recommendations
         ai_recommendations = await get_ai_food_recommendations(
             query=request.query,
             user_preferences=user_preferences,
             limit=request.limit,
-            available_foods=available_foods
+            available_foods=await get_available_foods_context()
         )
-        
-        # If recommendations include food IDs from our database, fetch the full details
-        if ai_recommendations.get("success") and ai_recommendations.get("recommendations"):
-            for recommendation in ai_recommendations["recommendations"]:
-                # Check if the recommendation has a food_id field that matches our database
-                if "food_id" in recommendation and recommendation["food_id"]:
-                    try:
-                        food_id = recommendation["food_id"]
-                        food_details = await execute_query(
-                            table="foods",
-                            query_type="select",
-                            filters={"id": food_id}
-                        )
-                        
-                        if food_details and len(food_details) > 0:
-                            recommendation["database_item"] = food_details[0]
-                    except Exception as e:
-                        logger.error(f"Error fetching food details for ID {recommendation.get('food_id')}: {e}")
-        
-        return ai_recommendations
+        return await _finalize(cache_key, ai_recommendations)
     except Exception as e:
-        logger.error(f"Error getting AI food recommendations: {e}")
+        logger.exception("Error getting %s recommendations", "AI food")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get AI food recommendations: {str(e)}"
         )
 
 
-@router.post("/dr-foodlove", response_model=DrFoodloveResponse)
+@router.post(
+    "/dr-foodlove",
+    response_class=ORJSONResponse,
+    responses={200: {"model": DrFoodloveResponse}}
+)
 async def dr_foodlove_recommendations(
     request: DrFoodloveRequest,
-    current_user: Optional[dict] = Depends(get_current_user)
+    current_user: Optional[dict] = Depends(get_current_user_fresh)
 ):
     """
     Get personalized food recommendations from Dr. Foodlove AI.
@@ -210,87 +314,39 @@ async def dr_foodlove_recommendations(
     If an item_id is provided, it will fetch the details of that food item.
     """
     try:
-        # Check if item_id is provided and fetch food item details
-        food_item = None
-        if request.item_id:
-            try:
-                food_id = UUID(request.item_id)
-                
-                # Fetch food item from database
-                food_items = await execute_query(
-                    table="foods",
-                    query_type="select",
-                    filters={"id": str(food_id)}
-                )
-                
-                if food_items and len(food_items) > 0:
-                    food_item = food_items[0]
-                    # Add the food item to the request query for context
-                    request.query = f"Tell me about this food: {food_item['title']}. {request.query}"
-            except Exception as e:
-                logger.error(f"Error fetching food item: {e}")
-                # Continue with the request even if food item fetch fails
+        user_preferences = _resolve_preferences(
+            current_user,
+            request.include_user_preferences,
+            request.custom_preferences,
+            extra_keys=("health_goals",)
+        )
         
-        # Get user preferences if requested and user is authenticated
-        user_preferences: Optional[Dict[str, Any]] = None
+        cache_key = _ai_cache_key(
+            "drfl",
+            request.query,
+            request.item_id,
+            user_preferences,
+            request.limit,
+            request.detailed_response
+        )
+        cached = await cache_get_bytes(cache_key)
+        if cached is not None:
+            return _json_bytes_response(cached)
         
-        if request.include_user_preferences and current_user:
-            # Get user preferences from database
-            user_id = UUID(current_user["id"])
-            
-            # Construct user preferences dictionary
-            user_preferences = {
-                "user_id": str(user_id),
-                "name": current_user.get("full_name", ""),
-                "email": current_user.get("email", ""),
-                "dietary_restrictions": current_user.get("dietary_restrictions", []),
-                "allergies": current_user.get("allergies", []),
-                "cuisine_preferences": current_user.get("cuisine_preferences", []),
-                "health_goals": current_user.get("health_goals", [])
-            }
-            
-            # Add any custom preferences from the request
-            if request.custom_preferences:
-                user_preferences.update(request.custom_preferences)
-        elif request.custom_preferences:
-            # Use only custom preferences if provided
-            user_preferences = request.custom_preferences
+        # The food item and the available foods context are independent
+        # lookups, so run them concurrently
+        available_foods, food_item = await asyncio.gather(
+            get_available_foods_context(),
+            _fetch_food_item(request.item_id)
+        )
         
-        # Fetch available foods from the database to provide context to the AI
-        available_foods = []
-        try:
-            # Get a sample of available foods from the database
-            foods_result = await execute_query(
-                table="foods",
-                query_type="select",
-                filters={"is_available": True},
-                limit=50  # Limit to 50 foods to avoid token limits
-            )
-            
-            if foods_result and len(foods_result) > 0:
-                # Extract relevant information from each food
-                available_foods = [
-                    {
-                        "name": food.get("title", ""),
-                        "description": food.get("description", ""),
-                        "category": food.get("category", ""),
-                        "dietary_requirements": food.get("dietary_requirements", []),
-                        "allergens": food.get("allergens", []),
-                        "id": str(food.get("id", ""))
-                    }
-                    for food in foods_result
-                ]
-                
-                logger.info(f"Fetched {len(available_foods)} available foods for Dr. FoodLove context")
-            else:
-                logger.warning("No available foods found in the database")
-        except Exception as e:
-            logger.error(f"Error fetching available foods: {e}")
-            # Continue without available foods if there's an error
+        query = request.query
+        if food_item:
+            # Add the food item to the query for context
+            query = f"Tell me about this food: {food_item['title']}. {query}"
         
-        # Get Dr. Foodlove recommendations
         recommendations = await get_dr_foodlove_recommendations(
-            query=request.query,
+            query=query,
             user_preferences=user_preferences,
             limit=request.limit,
             detailed_response=request.detailed_response,
@@ -300,35 +356,17 @@ async def dr_foodlove_recommendations(
         # Add food item to the response if it was fetched
         if food_item:
             recommendations["food_item"] = food_item
-            
-        # If recommendations include food IDs from our database, fetch the full details
-        if recommendations.get("success") and recommendations.get("recommendations"):
-            for recommendation in recommendations["recommendations"]:
-                # Check if the recommendation has a food_id field that matches our database
-                if "food_id" in recommendation and recommendation["food_id"]:
-                    try:
-                        food_id = recommendation["food_id"]
-                        food_details = await execute_query(
-                            table="foods",
-                            query_type="select",
-                            filters={"id": food_id}
-                        )
-                        
-                        if food_details and len(food_details) > 0:
-                            recommendation["database_item"] = food_details[0]
-                    except Exception as e:
-                        logger.error(f"Error fetching food details for ID {recommendation.get('food_id')}: {e}")
         
-        return recommendations
+        return await _finalize(cache_key, recommendations)
     except Exception as e:
-        logger.error(f"Error getting Dr. Foodlove recommendations: {e}")
+        logger.exception("Error getting %s recommendations", "Dr. Foodlove")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get Dr. Foodlove recommendations: {str(e)}"
         )
 
 
-@router.post("/dr-foodlove/image")
+@router.post("/dr-foodlove/image", response_class=ORJSONResponse)
 async def get_dr_foodlove_image_recommendations(
     query: str = Form(...),
     food_image: UploadFile = File(...),
@@ -336,124 +374,74 @@ async def get_dr_foodlove_image_recommendations(
     limit: int = Form(5),
     detailed_response: bool = Form(False),
     custom_preferences: Optional[str] = Form(None),
-    current_user: Optional[dict] = Depends(get_current_user)
+    current_user: Optional[dict] = Depends(get_current_user_fresh)
 ):
     """
     Get food recommendations from Dr. Foodlove AI based on an uploaded food image.
     
     This endpoint analyzes the uploaded image and provides nutritionally balanced recommendations.
     """
+    temp_file_path = None
     try:
-        # Save the uploaded image to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(food_image.filename)[1]) as temp_file:
-            temp_file.write(await food_image.read())
-            temp_file_path = temp_file.name
-        
         # Parse custom preferences if provided
         parsed_custom_preferences = None
         if custom_preferences:
             try:
-                parsed_custom_preferences = json.loads(custom_preferences)
-            except json.JSONDecodeError:
+                parsed_custom_preferences = orjson.loads(custom_preferences)
+            except orjson.JSONDecodeError:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Invalid JSON format for custom_preferences"
                 )
         
-        # Get user preferences if requested and user is authenticated
-        user_preferences: Optional[Dict[str, Any]] = None
+        user_preferences = _resolve_preferences(
+            current_user,
+            include_user_preferences,
+            parsed_custom_preferences,
+            extra_keys=("health_goals",)
+        )
+        
+        # An identical image with identical inputs gets the cached answer,
+        # without writing the image to disk or calling the model again
+        image_hash = await asyncio.to_thread(_hash_file, food_image.file)
+        cache_key = "drfl-img:" + image_hash + ":" + _ai_cache_key(
+            "inputs", query, user_preferences, limit, detailed_response
+        )
+        cached = await cache_get_bytes(cache_key)
+        if cached is not None:
+            return _json_bytes_response(cached)
         
-        if include_user_preferences and current_user:
-            # Get user preferences from database
-            user_id = UUID(current_user["id"])
-            
-            # Construct user preferences dictionary
-            user_preferences = {
-                "user_id": str(user_id),
-                "name": current_user.get("full_name", ""),
-                "email": current_user.get("email", ""),
-                "dietary_restrictions": current_user.get("dietary_restrictions", []),
-                "allergies": current_user.get("allergies", []),
-                "cuisine_preferences": current_user.get("cuisine_preferences", []),
-                "health_goals": current_user.get("health_goals", [])
-            }
-            
-            # Add any custom preferences
-            if parsed_custom_preferences:
-                user_preferences.update(parsed_custom_preferences)
-        elif parsed_custom_preferences:
-            # Use only custom preferences if provided
-            user_preferences = parsed_custom_preferences
+        # Fetch available foods for the AI context while the image is saved
+        foods_task = asyncio.create_task(get_available_foods_context())
         
-        # Fetch available foods from the database to provide context to the AI
-        available_foods = []
-        try:
-            # Get a sample of available foods from the database
-            foods_result = await execute_query(
-                table="foods",
-                query_type="select",
-                filters={"is_available": True},
-                limit=50  # Limit to 50 foods to avoid token limits
-            )
-            
-            if foods_result and len(foods_result) > 0:
-                # Extract relevant information from each food
-                available_foods = [
-                    {
-                        "name": food.get("title", ""),
-                        "description": food.get("description", ""),
-                        "category": food.get("category", ""),
-                        "dietary_requirements": food.get("dietary_requirements", []),
-                        "allergens": food.get("allergens", []),
-                        "id": str(food.get("id", ""))
-                    }
-                    for food in foods_result
-                ]
-                
-                logger.info(f"Fetched {len(available_foods)} available foods for Dr. FoodLove image context")
-            else:
-                logger.warning("No available foods found in the database")
-        except Exception as e:
-            logger.error(f"Error fetching available foods: {e}")
-            # Continue without available foods if there's an error
+        # Stream the uploaded image to a temporary file in chunks
+        fd, temp_file_path = tempfile.mkstemp(suffix=os.path.splitext(food_image.filename or "")[1])
+        os.close(fd)
+        async with aiofiles.open(temp_file_path, "wb") as out:
+            while chunk := await food_image.read(UPLOAD_CHUNK_SIZE):
+                await out.write(chunk)
         
-        # Get Dr. Foodlove recommendations with the image
         recommendations = await get_dr_foodlove_recommendations(
             query=query,
             user_preferences=user_preferences,
             limit=limit,
             food_image_path=temp_file_path,
             detailed_response=detailed_response,
-            available_foods=available_foods
+            available_foods=await foods_task
         )
-        
-        # If recommendations include food IDs from our database, fetch the full details
-        if recommendations.get("success") and recommendations.get("recommendations"):
-            for recommendation in recommendations["recommendations"]:
-                # Check if the recommendation has a food_id field that matches our database
-                if "food_id" in recommendation and recommendation["food_id"]:
-                    try:
-                        food_id = recommendation["food_id"]
-                        food_details = await execute_query(
-                            table="foods",
-                            query_type="select",
-                            filters={"id": food_id}
-                        )
-                        
-                        if food_details and len(food_details) > 0:
-                            recommendation["database_item"] = food_details[0]
-                    except Exception as e:
-                        logger.error(f"Error fetching food details for ID {recommendation.get('food_id')}: {e}")
-        
-        # Clean up the temporary file
-        os.unlink(temp_file_path)
-        
-        return recommendations
+        return await _finalize(cache_key, recommendations, IMAGE_RESPONSE_CACHE_TTL)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting Dr. Foodlove image recommendations: {e}")
+        logger.exception("Error getting %s recommendations", "Dr. Foodlove image")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get Dr. Foodlove image recommendations: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+    finally:
+        # Clean up the temporary file without blocking the event loop
+        if temp_file_path:
+            try:
+                await aiofiles.os.unlink(temp_file_path)
+            except FileNotFoundError:
+                pass
@@ -1,13 +1,25 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Path, Query
-from typing import List, Optional
-from datetime import datetime
-from pydantic import BaseModel, UUID4
+from fastapi import APIRouter, HTTPException, status, Depends, Path, Query, BackgroundTasks
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from typing import AsyncIterator, List, Literal, Optional
+import orjson
+import base64
+import binascii
+from datetime import datetime, timezone
+from uuid import UUID
+from pydantic import BaseModel, ConfigDict, UUID4
 from enum import Enum
-from ....core.supabase import execute_query
-from ...v1.endpoints.users import get_current_user
+from ....core.supabase import execute_query, execute_rpc
+from ....core.loader import BatchLoader
+from ....core.cache import get_redis, cache_get_bytes, cache_set_bytes
+from ....services.food_service import FOOD_DETAIL_COLUMNS, invalidate_available_foods_context
+from ....services.swap_service import NEARBY_SWAPS_CACHE_TTL, nearby_swaps_cache_key, invalidate_nearby_swaps
+from ...v1.endpoints.users import get_current_user, get_current_user_fresh
 
 router = APIRouter(prefix="/swaps", tags=["swaps"])
 
+# Concurrent lookups of swaps by id share one query
+swap_loader = BatchLoader("swaps")
+
 class SwapStatus(str, Enum):
     POTENTIAL = "potential"  # For potential swaps that haven't been requested yet
     PENDING = "pending"
@@ -25,7 +37,15 @@ class SwapUpdate(BaseModel):
     status: SwapStatus
     response_message: Optional[str] = None
 
+# Columns of a swap row as exposed to clients (matches SwapResponse)
+SWAP_COLUMNS = (
+    "id,requester_id,provider_id,requester_food_id,provider_food_id,"
+    "message,response_message,status,created_at,updated_at"
+)
+
 class SwapResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+    
     id: UUID4
     requester_id: UUID4
     provider_id: UUID4
@@ -38,6 +58,8 @@ class SwapResponse(BaseModel):
     updated_at: datetime
 
 class SwapDetailResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+    
     id: UUID4
     requester_id: UUID4
     provider_id: UUID4
@@ -54,6 +76,7 @@ class SwapDetailResponse(BaseModel):
 @router.post("/", response_model=SwapResponse, status_code=status.HTTP_201_CREATED)
 async def create_swap_request(
     swap: SwapCreate,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -71,21 +94,24 @@ async def create_swap_request(
     
     requester_id = current_user["id"]
     
-    # Verify the requester food belongs to the requester
-    requester_food = await execute_query(
+    # Fetch both foods in one query. foods.user_id references users, so a
+    # provider food owned by swap.provider_id also proves the provider exists.
+    foods = await execute_query(
         table="foods",
         query_type="select",
-        filters={"id": str(swap.requester_food_id)}
+        filters={"id": {"in": [str(swap.requester_food_id), str(swap.provider_food_id)]}},
+        select="id,user_id,is_available"
     )
+    foods_by_id = {food["id"]: food for food in foods or []}
     
-    if not requester_food or len(requester_food) == 0:
+    # Verify the requester food belongs to the requester
+    requester_food = foods_by_id.get(str(swap.requester_food_id))
+    if not requester_food:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Requester food not found"
         )
     
-    requester_food = requester_food[0]
-    
     if requester_food["user_id"] != requester_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -93,50 +119,42 @@ async def create_swap_request(
         )
     
     # Verify the provider food exists and is available
-    provider_food = await execute_query(
-        table="foods",
-        query_type="select",
-        filters={"id": str(swap.provider_food_id)}
-    )
-    
-    if not provider_food or len(provider_food) == 0:
+    provider_food = foods_by_id.get(str(swap.provider_food_id))
+    if not provider_food:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Provider food not found"
         )
     
-    provider_food = provider_food[0]
-    
     if not provider_food["is_available"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="This food item is not available for swapping"
         )
     
-    # Verify the provider exists
-    provider = await execute_query(
-        table="users",
-        query_type="select",
-        filters={"id": str(swap.provider_id)}
-    )
-    
-    if not provider or len(provider) == 0:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Provider not found"
+    # Verify the provider owns the provider food. Only on a mismatch do we
+    # need to look the provider up, to tell a missing provider apart.
+    if provider_food["user_id"] != str(swap.provider_id):
+        provider = await execute_query(
+            table="users",
+            query_type="select",
+            filters={"id": str(swap.provider_id)},
+            select="id"
         )
-    
-    provider = provider[0]
-    
-    # Verify the provider owns the provider food
-    if provider_food["user_id"] != provider["id"]:
+        
+        if not provider or len(provider) == 0:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Provider not found"
+            )
+        
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="The provider does not own this food item"
         )
     
     # Create swap in database
-    now = datetime.now().isoformat()
+    now = datetime.now(timezone.utc).isoformat()
     swap_data = {
         "requester_id": requester_id,
         "provider_id": str(swap.provider_id),
@@ -172,22 +190,71 @@ async def create_swap_request(
         "updated_at": now
     }
     
-    await execute_query(
+    # Send the notification after the response has gone out
+    background_tasks.add_task(
+        execute_query,
         table="notifications",
         query_type="insert",
-        data=notification_data
+        data=notification_data,
+        return_representation=False
     )
     
     return new_swap[0]
 
+# Header carrying the cursor of the next page of a paginated listing
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def _encode_cursor(values: list) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor."""
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode()
+
+def _is_cursor_pair(created_at, row_id) -> bool:
+    """Check one (created_at, id) sort key: an ISO timestamp and a UUID."""
+    if not isinstance(created_at, str) or not isinstance(row_id, str):
+        return False
+    try:
+        datetime.fromisoformat(created_at)
+        UUID(row_id)
+    except ValueError:
+        return False
+    return True
+
+def _decode_cursor(cursor: str, size: int) -> list:
+    """
+    Decode a cursor made by _encode_cursor, rejecting anything malformed.
+    
+    Cursors hold (created_at, id) pairs, and the values go straight into
+    query filters, so each pair must be a timestamp and a UUID.
+    """
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        values = None
+    
+    if (
+        not isinstance(values, list)
+        or len(values) != size
+        or not all(_is_cursor_pair(values[i], values[i + 1]) for i in range(0, size, 2))
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return values
+
 @router.get("/", response_model=List[SwapResponse])
 async def get_swaps(
     status: Optional[SwapStatus] = None,
-    role: Optional[str] = Query(None, regex="^(requester|provider)$"),
+    role: Optional[Literal["requester", "provider"]] = None,
+    limit: int = Query(50, ge=1, le=200),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Get all swaps for the current user with optional filtering.
+    Get the current user's swaps with optional filtering, newest first.
+    
+    Results are paginated. When there may be more swaps, the response has an
+    X-Next-Cursor header to pass back as `after` for the next page.
     """
     user_id = current_user["id"]
     
@@ -200,27 +267,152 @@ async def get_swaps(
         filters["provider_id"] = user_id
     else:
         # If no role specified, get all swaps where the user is either requester or provider
-        # This is a bit more complex and requires post-filtering
-        pass
+        filters["or"] = {"requester_id": user_id, "provider_id": user_id}
     
     if status:
         filters["status"] = status.value
     
+    # Continue after the last swap of the previous page
+    if after:
+        created_at, swap_id = _decode_cursor(after, 2)
+        filters["and"] = {
+            "or": {
+                "created_at": {"lt": created_at},
+                "and": {"created_at": created_at, "id": {"lt": swap_id}}
+            }
+        }
+    
     # Get swaps from database
     swaps = await execute_query(
         table="swaps",
         query_type="select",
-        filters=filters
+        filters=filters,
+        select=SWAP_COLUMNS,
+        order_by={"created_at": "desc", "id": "desc"},
+        limit=limit
     )
     
-    # If no role specified, filter after the query
-    if not role:
-        swaps = [
-            swap for swap in swaps 
-            if swap["requester_id"] == user_id or swap["provider_id"] == user_id
-        ]
+    # The rows already have the SwapResponse shape, so send them as they are
+    # instead of validating and re-serializing every one
+    response = ORJSONResponse(content=swaps)
+    if len(swaps) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = _encode_cursor([swaps[-1]["created_at"], swaps[-1]["id"]])
+    return response
+
+async def _iter_nearby_swaps(
+    user_id: str,
+    candidates: List[dict],
+    cache_key: str,
+    next_cursor: Optional[str]
+) -> AsyncIterator[bytes]:
+    """
+    Yield a JSON array of virtual swap objects, one potential swap at a time.
     
-    return swaps
+    When Redis is configured, the encoded chunks are also kept and the full
+    body is cached once the last one has been sent. The cache entry starts
+    with the next page's cursor (empty when there is none) on its own line,
+    followed by the body. Without Redis nothing is kept.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    chunks = [(next_cursor or "").encode() + b"\n", b"["] if get_redis() is not None else None
+    
+    yield b"["
+    for index, candidate in enumerate(candidates):
+        swap = {
+            "id": None,  # This is a virtual swap, not yet created
+            "requester_id": user_id,
+            "provider_id": candidate["provider_food"]["user_id"],
+            "requester_food_id": candidate["requester_food"]["id"],
+            "provider_food_id": candidate["provider_food"]["id"],
+            "message": None,
+            "response_message": None,
+            "status": "potential",  # This is a potential swap
+            "created_at": now,
+            "updated_at": now,
+            "requester_food": candidate["requester_food"],
+            "provider_food": candidate["provider_food"]
+        }
+        chunk = (b"," if index else b"") + orjson.dumps(swap)
+        if chunks is not None:
+            chunks.append(chunk)
+        yield chunk
+    yield b"]"
+    
+    if chunks is not None:
+        await cache_set_bytes(cache_key, b"".join(chunks) + b"]", NEARBY_SWAPS_CACHE_TTL)
+
+@router.get("/nearby", response_model=List[SwapDetailResponse])
+async def get_nearby_swaps(
+    radius: float = Query(5.0, description="Search radius in kilometers", ge=0.1, le=50.0),
+    swap_status: Optional[SwapStatus] = Query(None, alias="status"),
+    limit: int = Query(100, description="Maximum number of potential swaps", ge=1, le=500),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    current_user: dict = Depends(get_current_user_fresh)
+):
+    """
+    Get food swaps available near the current user's location.
+    
+    This endpoint returns food swaps from users within the specified radius (in kilometers)
+    of the current user's location. Results are paginated like GET /swaps.
+    """
+    try:
+        # The current user's row already carries their location
+        if not current_user.get("location"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="User location not set"
+            )
+        
+        # Serve a recent response for the same query from the cache
+        cache_key = await nearby_swaps_cache_key(current_user["id"], radius, limit, after)
+        cached = await cache_get_bytes(cache_key)
+        if cached is not None:
+            cached_cursor, body = cached.split(b"\n", 1)
+            headers = {NEXT_CURSOR_HEADER: cached_cursor.decode()} if cached_cursor else None
+            return Response(content=body, media_type="application/json", headers=headers)
+        
+        # Continue after the last candidate of the previous page
+        args = {
+            "p_user_id": current_user["id"],
+            "p_radius_m": radius * 1000,  # Convert km to meters
+            "p_limit": limit
+        }
+        if after:
+            (
+                args["p_after_provider_created_at"],
+                args["p_after_provider_food_id"],
+                args["p_after_requester_created_at"],
+                args["p_after_requester_food_id"]
+            ) = _decode_cursor(after, 4)
+        
+        # Pair the user's foods with nearby users' foods in the database
+        candidates = await execute_rpc("get_nearby_swap_candidates", args) or []
+        
+        next_cursor = None
+        if len(candidates) == limit:
+            provider_food = candidates[-1]["provider_food"]
+            requester_food = candidates[-1]["requester_food"]
+            next_cursor = _encode_cursor([
+                provider_food["created_at"],
+                provider_food["id"],
+                requester_food["created_at"],
+                requester_food["id"]
+            ])
+        
+        # Stream the virtual swaps, encoding one at a time. The encoded body is
+        # only kept in memory when it will be written to the Redis cache.
+        return StreamingResponse(
+            _iter_nearby_swaps(current_user["id"], candidates, cache_key, next_cursor),
+            media_type="application/json",
+            headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
 
 @router.get("/{swap_id}", response_model=SwapResponse)
 async def get_swap(
@@ -233,20 +425,14 @@ async def get_swap(
     user_id = current_user["id"]
     
     # Get swap from database
-    swap = await execute_query(
-        table="swaps",
-        query_type="select",
-        filters={"id": str(swap_id)}
-    )
+    swap = await swap_loader.load(swap_id)
     
-    if not swap or len(swap) == 0:
+    if not swap:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Swap not found"
         )
     
-    swap = swap[0]
-    
     # Verify the user is part of this swap
     if swap["requester_id"] != user_id and swap["provider_id"] != user_id:
         raise HTTPException(
@@ -268,20 +454,14 @@ async def update_swap_status(
     user_id = current_user["id"]
     
     # Get swap from database
-    swap = await execute_query(
-        table="swaps",
-        query_type="select",
-        filters={"id": str(swap_id)}
-    )
+    swap = await swap_loader.load(swap_id)
     
-    if not swap or len(swap) == 0:
+    if not swap:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Swap not found"
         )
     
-    swap = swap[0]
-    
     # Verify the user is part of this swap
     if swap["requester_id"] != user_id and swap["provider_id"] != user_id:
         raise HTTPException(
@@ -315,10 +495,33 @@ async def update_swap_status(
                 detail=f"Cannot change status from {current_status} to {new_status}"
             )
     
+    # Accepting also marks both foods unavailable, so it runs as one
+    # transaction in the database
+    if new_status == SwapStatus.ACCEPTED.value:
+        updated_swap = await execute_rpc(
+            "accept_swap",
+            {
+                "p_swap_id": str(swap_id),
+                "p_response_message": swap_update.response_message or None
+            }
+        )
+        
+        # The swap stopped being pending since it was read
+        if not updated_swap or len(updated_swap) == 0:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Swap is no longer pending"
+            )
+        
+        await invalidate_available_foods_context()
+        await invalidate_nearby_swaps()
+        
+        return updated_swap[0]
+    
     # Update swap in database
     update_data = {
         "status": new_status,
-        "updated_at": datetime.now().isoformat()
+        "updated_at": datetime.now(timezone.utc).isoformat()
     }
     
     if swap_update.response_message:
@@ -337,22 +540,6 @@ async def update_swap_status(
             detail="Failed to update swap"
         )
     
-    # If the swap is accepted, mark both food items as unavailable
-    if new_status == SwapStatus.ACCEPTED.value:
-        await execute_query(
-            table="foods",
-            query_type="update",
-            filters={"id": swap["requester_food_id"]},
-            data={"is_available": False, "updated_at": datetime.now().isoformat()}
-        )
-        
-        await execute_query(
-            table="foods",
-            query_type="update",
-            filters={"id": swap["provider_food_id"]},
-            data={"is_available": False, "updated_at": datetime.now().isoformat()}
-        )
-    
     return updated_swap[0]
 
 @router.get("/{swap_id}/detail", response_model=SwapDetailResponse)
@@ -366,20 +553,14 @@ async def get_swap_detail(
     user_id = current_user["id"]
     
     # Get swap from database
-    swap = await execute_query(
-        table="swaps",
-        query_type="select",
-        filters={"id": str(swap_id)}
-    )
+    swap = await swap_loader.load(swap_id)
     
-    if not swap or len(swap) == 0:
+    if not swap:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Swap not found"
         )
     
-    swap = swap[0]
-    
     # Verify the user is part of this swap
     if swap["requester_id"] != user_id and swap["provider_id"] != user_id:
         raise HTTPException(
@@ -387,27 +568,24 @@ async def get_swap_detail(
             detail="You don't have permission to view this swap"
         )
     
-    # Get requester food details
-    requester_food = await execute_query(
+    # Get both foods' details in one query
+    foods = await execute_query(
         table="foods",
         query_type="select",
-        filters={"id": swap["requester_food_id"]}
+        filters={"id": {"in": [swap["requester_food_id"], swap["provider_food_id"]]}},
+        select=FOOD_DETAIL_COLUMNS
     )
+    foods_by_id = {food["id"]: food for food in foods or []}
     
-    if not requester_food or len(requester_food) == 0:
+    requester_food = foods_by_id.get(swap["requester_food_id"])
+    if not requester_food:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Requester food not found"
         )
     
-    # Get provider food details
-    provider_food = await execute_query(
-        table="foods",
-        query_type="select",
-        filters={"id": swap["provider_food_id"]}
-    )
-    
-    if not provider_food or len(provider_food) == 0:
+    provider_food = foods_by_id.get(swap["provider_food_id"])
+    if not provider_food:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Provider food not found"
@@ -416,141 +594,8 @@ async def get_swap_detail(
     # Add food details to swap
     swap_detail = {
         **swap,
-        "requester_food": requester_food[0],
-        "provider_food": provider_food[0]
+        "requester_food": requester_food,
+        "provider_food": provider_food
     }
     
     return swap_detail
-
-@router.get("/nearby", response_model=List[SwapDetailResponse])
-async def get_nearby_swaps(
-    radius: float = Query(5.0, description="Search radius in kilometers", ge=0.1, le=50.0),
-    status: Optional[SwapStatus] = None,
-    current_user: dict = Depends(get_current_user)
-):
-    """
-    Get food swaps available near the current user's location.
-    
-    This endpoint returns food swaps from users within the specified radius (in kilometers)
-    of the current user's location.
-    """
-    try:
-        # Get the current user's location
-        user_result = await execute_query(
-            table="users",
-            query_type="select",
-            filters={"id": current_user["id"]}
-        )
-        
-        if not user_result or len(user_result) == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
-        user_location = user_result[0].get("location")
-        
-        if not user_location:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User location not set"
-            )
-        
-        # First, find nearby users
-        nearby_users_query = """
-        SELECT id
-        FROM users
-        WHERE id != %s
-        AND location IS NOT NULL
-        AND ST_DWithin(
-            ST_SetSRID(ST_MakePoint(
-                (location->>'longitude')::float,
-                (location->>'latitude')::float
-            ), 4326)::geography,
-            ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography,
-            %s
-        )
-        """
-        
-        nearby_users_params = [
-            current_user["id"],
-            user_location["longitude"],
-            user_location["latitude"],
-            radius * 1000  # Convert km to meters
-        ]
-        
-        nearby_users_result = await execute_query(
-            query_type="raw",
-            query=nearby_users_query,
-            params=nearby_users_params
-        )
-        
-        if not nearby_users_result or len(nearby_users_result) == 0:
-            return []
-        
-        # Extract user IDs
-        nearby_user_ids = [user["id"] for user in nearby_users_result]
-        
-        # Find foods from nearby users that are available for swap
-        foods_query = """
-        SELECT f.*
-        FROM foods f
-        WHERE f.user_id = ANY(%s)
-        AND f.is_available = true
-        """
-        
-        foods_params = [nearby_user_ids]
-        
-        foods_result = await execute_query(
-            query_type="raw",
-            query=foods_query,
-            params=foods_params
-        )
-        
-        if not foods_result or len(foods_result) == 0:
-            return []
-        
-        # Get the current user's foods
-        user_foods_result = await execute_query(
-            table="foods",
-            query_type="select",
-            filters={"user_id": current_user["id"], "is_available": True}
-        )
-        
-        if not user_foods_result or len(user_foods_result) == 0:
-            # User has no foods to swap
-            return []
-        
-        # Create virtual swap objects for each potential swap
-        nearby_swaps = []
-        
-        for user_food in user_foods_result:
-            for nearby_food in foods_result:
-                # Skip foods from the same user
-                if nearby_food["user_id"] == current_user["id"]:
-                    continue
-                
-                # Create a virtual swap object
-                swap = {
-                    "id": None,  # This is a virtual swap, not yet created
-                    "requester_id": current_user["id"],
-                    "provider_id": nearby_food["user_id"],
-                    "requester_food_id": user_food["id"],
-                    "provider_food_id": nearby_food["id"],
-                    "message": None,
-                    "response_message": None,
-                    "status": "potential",  # This is a potential swap
-                    "created_at": datetime.now().isoformat(),
-                    "updated_at": datetime.now().isoformat(),
-                    "requester_food": user_food,
-                    "provider_food": nearby_food
-                }
-                
-                nearby_swaps.append(swap)
-        
-        return nearby_swaps
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        ) 
\ No newline at end of file
@@ -1,10 +1,10 @@
-from fastapi import APIRouter, HTTPException, status, UploadFile, File, Depends, Path, Query
+from fastapi import APIRouter, HTTPException, status, UploadFile, File, Depends, Path, Query, Request, Response
 from fastapi.responses import FileResponse, RedirectResponse
 from typing import Optional, List
 from ....services.file_service import save_upload_file, delete_file, upload_to_supabase
 from pathlib import Path
-from ...v1.endpoints.users import get_current_user
-from ....core.supabase import execute_query, execute_raw_sql
+from ...v1.endpoints.users import get_current_user, invalidate_current_user_cache
+from ....core.supabase import execute_query, execute_raw_sql, SUPABASE_URL
 import uuid
 import os
 from pydantic import UUID4
@@ -14,6 +14,16 @@ router = APIRouter(prefix="/uploads", tags=["uploads"])
 # Define upload directory
 UPLOAD_DIR = Path("uploads")
 
+# Storage buckets new uploads are written to
+STORAGE_BUCKETS = {"profile_pictures", "food_images"}
+
+# Whether files saved to local disk before the move to Supabase Storage are
+# still served from here
+SERVE_LOCAL_UPLOADS = os.getenv("SERVE_LOCAL_UPLOADS", "True").lower() == "true"
+
+# Uploaded files get a fresh random name and are never rewritten in place
+UPLOAD_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 @router.post("/profile-picture", status_code=status.HTTP_201_CREATED)
 async def upload_profile_picture(
     file: UploadFile = File(...),
@@ -42,9 +52,12 @@ async def upload_profile_picture(
             table="users",
             query_type="update",
             data={"profile_picture": file_url},
-            filters={"id": current_user["id"]}
+            filters={"id": current_user["id"]},
+            return_representation=False
         )
         
+        await invalidate_current_user_cache(current_user["id"])
+        
         return {
             "message": "Profile picture uploaded successfully",
             "file_url": file_url
@@ -85,7 +98,8 @@ async def upload_food_image(
             food_result = await execute_query(
                 table="foods",
                 query_type="select",
-                filters={"id": str(food_id), "user_id": current_user["id"]}
+                filters={"id": str(food_id), "user_id": current_user["id"]},
+                select="images"
             )
             
             if not food_result or len(food_result) == 0:
@@ -105,7 +119,8 @@ async def upload_food_image(
                 table="foods",
                 query_type="update",
                 data={"images": updated_images},
-                filters={"id": str(food_id)}
+                filters={"id": str(food_id)},
+                return_representation=False
             )
         
         return {
@@ -120,21 +135,40 @@ async def upload_food_image(
         )
 
 @router.get("/{file_path:path}", status_code=status.HTTP_200_OK)
-async def get_uploaded_file(file_path: str):
+async def get_uploaded_file(file_path: str, request: Request):
     """
     Get an uploaded file by its path.
     
-    This endpoint is for backward compatibility. New uploads use Supabase Storage.
+    Paths of the form {bucket}/{object} are redirected to the public Supabase
+    Storage URL, so the bytes are served by the Storage CDN rather than this
+    worker. Legacy files on local disk are still served directly when
+    SERVE_LOCAL_UPLOADS is enabled.
     """
-    full_path = UPLOAD_DIR / file_path
+    if SERVE_LOCAL_UPLOADS:
+        full_path = UPLOAD_DIR / file_path
+        
+        if full_path.is_file():
+            st = full_path.stat()
+            etag = f'W/"{st.st_size:x}-{int(st.st_mtime):x}"'
+            headers = {"ETag": etag, "Cache-Control": UPLOAD_CACHE_CONTROL}
+            
+            if request.headers.get("if-none-match") == etag:
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+            
+            return FileResponse(full_path, headers=headers)
+    
+    bucket, _, object_path = file_path.partition("/")
     
-    if not full_path.exists():
+    if bucket not in STORAGE_BUCKETS or not object_path:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="File not found"
         )
     
-    return FileResponse(full_path)
+    return RedirectResponse(
+        url=f"{SUPABASE_URL}/storage/v1/object/public/{bucket}/{object_path}",
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT
+    )
 
 @router.delete("/{file_path:path}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_uploaded_file(
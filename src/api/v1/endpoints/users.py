@@ -1,21 +1,31 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Path, Query, BackgroundTasks, Request, Response
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from fastapi.responses import RedirectResponse
+from typing import Annotated, Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from uuid import UUID, uuid4
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from ....schemas.user import UserCreate, UserResponse, UserUpdate, Token, TokenData, VerificationRequest, Location
 from ....core.supabase import execute_query, sign_up, sign_in, get_user, get_supabase_client, execute_raw_sql, check_user_exists
+from ....core.cache import cache_get, cache_set, cache_delete, cache_add, cache_get_bytes, cache_set_bytes
+from ....core.database import get_db_pool, db_fetch, db_fetchrow
+from ....core.smtp import send_email
+from ....services.swap_service import invalidate_nearby_swaps
+import asyncio
+import orjson
 import random
 import string
 import os
-import smtplib
+import time
+import hashlib
+import base64
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from pydantic import UUID4, EmailStr
 from dotenv import load_dotenv
 import httpx
-import json
 import psycopg2
 import psycopg2.extras
 from urllib.parse import urlparse
@@ -23,19 +33,41 @@ from urllib.parse import urlparse
 # Load environment variables
 load_dotenv()
 
+# Configure logging
+logger = logging.getLogger(__name__)
+
 router = APIRouter(tags=["users"])
 
 SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRATION_MINUTES", "30"))
 
-EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.example.com")
-EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
-EMAIL_USERNAME = os.getenv("EMAIL_USERNAME", "")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "")
 EMAIL_FROM = os.getenv("EMAIL_FROM", "noreply@oishii.com")
+FRONTEND_URL = os.getenv("FRONTEND_URL")
+
+# New hashes use argon2id with modest memory settings. bcrypt hashes still
+# verify and are upgraded on the next successful login (needs_update).
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__memory_cost=19456,
+    argon2__time_cost=2,
+    argon2__parallelism=1,
+    bcrypt__rounds=10
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing is CPU-bound, so it runs on its own pool with one thread per
+# core. Bursts of logins queue here instead of oversubscribing the CPU or
+# taking every thread of the default executor.
+_password_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="password")
+
+# Columns of a user as exposed to clients (matches UserResponse). Leaves out
+# the password hash and verification codes.
+USER_COLUMNS = (
+    "id,email,first_name,last_name,bio,cook_type,cook_frequency,dietary_requirements,"
+    "allergies,purpose,home_address,location,profile_picture,created_at,updated_at,"
+    "swap_rating,is_verified"
+)
 
 # Update OAuth2PasswordBearer to include description for Swagger UI
 oauth2_scheme = OAuth2PasswordBearer(
@@ -44,42 +76,158 @@ oauth2_scheme = OAuth2PasswordBearer(
     scheme_name="JWT"
 )
 
-def verify_password(plain_password, hashed_password):
-    print(f"Verifying password: plain_password length={len(plain_password) if plain_password else 0}, hashed_password length={len(hashed_password) if hashed_password else 0}")
+# Same scheme, but lets anonymous requests through with token=None
+oauth2_scheme_optional = OAuth2PasswordBearer(
+    tokenUrl="/api/v1/users/login",
+    scheme_name="JWT",
+    auto_error=False
+)
+
+# Columns needed to issue a token (see user_token_claims), and to check
+# credentials first at login
+TOKEN_COLUMNS = "id,email,first_name,last_name,profile_picture,is_verified"
+LOGIN_COLUMNS = TOKEN_COLUMNS + ",password"
+
+async def fetch_user_by_email(email: str, columns: str = USER_COLUMNS) -> Optional[dict]:
+    """
+    Get one user by email, or None.
+    
+    Uses the direct Postgres pool when DATABASE_URL is configured, where the
+    statement is prepared once per connection; otherwise goes through PostgREST.
+    """
+    if await get_db_pool() is not None:
+        return await db_fetchrow(f"SELECT {columns} FROM users WHERE email = $1 LIMIT 1", email)
+    
+    users = await execute_query(
+        table="users",
+        query_type="select",
+        filters={"email": email},
+        select=columns,
+        limit=1
+    )
+    return users[0] if users else None
+
+async def fetch_user_by_id(user_id: str, columns: str = USER_COLUMNS) -> Optional[dict]:
+    """Get one user by id, or None."""
+    if await get_db_pool() is not None:
+        return await db_fetchrow(f"SELECT {columns} FROM users WHERE id = $1::uuid", str(user_id))
+    
+    users = await execute_query(
+        table="users",
+        query_type="select",
+        filters={"id": str(user_id)},
+        select=columns
+    )
+    return users[0] if users else None
+
+async def mark_user_verified(email: str) -> Optional[str]:
+    """Set is_verified on the user with this email in one UPDATE and return their id, or None."""
+    if await get_db_pool() is not None:
+        row = await db_fetchrow(
+            "UPDATE users SET is_verified = true, updated_at = now() WHERE email = $1 RETURNING id",
+            email
+        )
+        return row["id"] if row else None
+    
+    updated = await execute_query(
+        table="users",
+        query_type="update",
+        filters={"email": email},
+        data={"is_verified": True, "updated_at": datetime.now(timezone.utc)}
+    )
+    return updated[0]["id"] if updated else None
+
+async def fetch_users(limit: int, offset: int) -> List[dict]:
+    """Get a page of users, oldest first."""
+    if await get_db_pool() is not None:
+        return await db_fetch(
+            f"SELECT {USER_COLUMNS} FROM users ORDER BY created_at, id LIMIT $1 OFFSET $2",
+            limit,
+            offset
+        )
+    
+    return await execute_query(
+        table="users",
+        query_type="select",
+        select=USER_COLUMNS,
+        order_by={"created_at": "asc", "id": "asc"},
+        limit=limit,
+        offset=offset
+    )
+
+# Lookups currently running, by key. Concurrent callers asking for the same
+# thing wait on one shared task instead of repeating the work.
+_inflight: Dict[str, asyncio.Task] = {}
+
+async def _single_flight(key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run compute() once for all concurrent callers with the same key.
+    
+    The work runs as its own task and every caller awaits it through a
+    shield, so a caller being cancelled (e.g. the client disconnecting)
+    does not cancel it for the others.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(compute())
+        _inflight[key] = task
+        
+        def _finished(done: asyncio.Task):
+            _inflight.pop(key, None)
+            # Mark a failure as seen in case every caller was cancelled
+            if not done.cancelled():
+                done.exception()
+        
+        task.add_done_callback(_finished)
+    return await asyncio.shield(task)
+
+async def verify_password(plain_password, hashed_password):
+    logger.debug("Verifying password: plain_password length=%s, hashed_password length=%s", len(plain_password) if plain_password else 0, len(hashed_password) if hashed_password else 0)
     if not plain_password or not hashed_password:
-        print("Missing password or hash")
+        logger.debug("Missing password or hash")
         return False
     try:
-        result = pwd_context.verify(plain_password, hashed_password)
-        print(f"Password verification result: {result}")
+        # Hashing is CPU-bound, so run it off the event loop, and only once
+        # for a burst of identical attempts
+        key = "password:" + hashlib.sha256(f"{hashed_password}\0{plain_password}".encode()).hexdigest()
+        result = await _single_flight(key, lambda: asyncio.get_running_loop().run_in_executor(
+            _password_executor, pwd_context.verify, plain_password, hashed_password
+        ))
+        logger.debug("Password verification result: %s", result)
         return result
     except Exception as e:
-        print(f"Password verification error: {str(e)}")
+        logger.warning("Password verification error: %s", e)
         return False
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await asyncio.get_running_loop().run_in_executor(_password_executor, pwd_context.hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
     to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def user_token_claims(user: dict) -> dict:
+    """
+    Claims identifying a user inside an access token, so get_current_user can
+    rebuild the user without a database round-trip.
+    """
+    return {
+        "sub": user["id"],
+        "em": user.get("email"),
+        "v": bool(user.get("is_verified")),
+        "fn": user.get("first_name"),
+        "ln": user.get("last_name"),
+        "pp": user.get("profile_picture")
+    }
+
 def generate_verification_code():
     return ''.join(random.choices(string.digits, k=6))
 
-async def send_verification_email(email: str, code: str):
-    try:
-        # Create message
-        message = MIMEMultipart()
-        message["From"] = EMAIL_FROM
-        message["To"] = email
-        message["Subject"] = "Oishii - Verify Your Email"
-        
-        # Email body
-        body = f"""
+# Verification email body; only the code changes between sends
+VERIFICATION_EMAIL_TEMPLATE = """
         <html>
         <body>
             <h2>Welcome to Oishii!</h2>
@@ -90,60 +238,169 @@ async def send_verification_email(email: str, code: str):
         </body>
         </html>
         """
+
+async def send_verification_email(email: str, code: str):
+    try:
+        # A single HTML part, so no multipart container is needed. The body is
+        # plain ASCII, so name the charset instead of letting MIMEText probe it.
+        message = MIMEText(VERIFICATION_EMAIL_TEMPLATE.format(code=code), "html", "us-ascii")
+        message["From"] = EMAIL_FROM
+        message["To"] = email
+        message["Subject"] = "Oishii - Verify Your Email"
         
-        # Attach body to message
-        message.attach(MIMEText(body, "html"))
-        
-        # Connect to SMTP server and send email
-        with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as server:
-            server.starttls()
-            server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-            server.send_message(message)
+        # Send over the shared, already logged-in SMTP connection
+        await send_email(message)
             
-        print(f"Verification email sent to {email}")
+        logger.debug("Verification email sent to %s", email)
     except Exception as e:
-        print(f"Failed to send verification email: {e}")
+        logger.warning("Failed to send verification email: %s", e)
         # Fall back to printing the code for development purposes
-        print(f"Verification code for {email}: {code}")
+        logger.info("Verification code for %s: %s", email, code)
+
+# Minimum seconds between verification emails to one address, and between
+# registrations from one client address
+RESEND_VERIFICATION_COOLDOWN = 60
+REGISTER_COOLDOWN = 10
+
+def _client_address(request: Request) -> str:
+    """
+    The address of the client that sent the request.
+    
+    Behind Fly's proxy request.client is the proxy itself, so prefer the
+    Fly-Client-IP header Fly sets, then the first X-Forwarded-For hop.
+    """
+    fly_client_ip = request.headers.get("fly-client-ip")
+    if fly_client_ip:
+        return fly_client_ip.strip()
+    forwarded_for = request.headers.get("x-forwarded-for")
+    if forwarded_for:
+        return forwarded_for.split(",", 1)[0].strip()
+    return request.client.host if request.client else "unknown"
+
+# How long a resolved user stays cached for a token, at most
+CURRENT_USER_CACHE_TTL = 300
+
+def _current_user_cache_key(user_id: str) -> str:
+    """Cache key for a user's row as resolved by get_current_user."""
+    return f"user:{user_id}"
+
+# Public profile reads share the user:{id} entry above, but only keep it briefly
+USER_PROFILE_CACHE_TTL = 30
+USER_LIST_CACHE_TTL = 10
+
+async def invalidate_current_user_cache(user_id: str):
+    """Drop the cached user after the user's row changes."""
+    await cache_delete(_current_user_cache_key(user_id))
+
+# Users resolved from token claims, kept in process for at most TOKEN_CACHE_TTL
+# seconds (never past the token's exp) so repeat requests skip the JWT check
+TOKEN_CACHE_TTL = 300
+TOKEN_CACHE_MAX_SIZE = 10_000
+_token_cache: Dict[str, Tuple[float, dict]] = {}
+
+def _remember_token(key: str, user: dict, expires_at: float):
+    """Store a resolved user in the token cache, making room if it is full."""
+    if len(_token_cache) >= TOKEN_CACHE_MAX_SIZE:
+        now = time.time()
+        for stale_key in [k for k, (exp, _) in _token_cache.items() if exp <= now]:
+            del _token_cache[stale_key]
+        if len(_token_cache) >= TOKEN_CACHE_MAX_SIZE:
+            _token_cache.clear()
+    _token_cache[key] = (expires_at, user)
+
+def _peek_exp(token: str) -> Optional[float]:
+    """Read the exp claim without verifying the token, or None if it can't be read."""
+    try:
+        payload_segment = token.split(".", 2)[1]
+        exp = orjson.loads(base64.urlsafe_b64decode(payload_segment + "=" * (-len(payload_segment) % 4))).get("exp")
+    except (IndexError, ValueError, AttributeError):
+        return None
+    return exp if isinstance(exp, (int, float)) else None
+
+def _reject_expired_token(token: str):
+    """
+    Reject a token whose exp has passed before paying for signature checks.
+    
+    The claim is unverified here, so it is only used to reject early; a token
+    that passes still goes through jwt.decode.
+    """
+    exp = _peek_exp(token)
+    if exp is not None and exp < time.time():
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication token: Signature has expired.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
-    """Get the current authenticated user."""
+    """
+    Get the current authenticated user from the token's claims.
+    
+    Only the fields carried in the token are present (id, email, is_verified,
+    first_name, last_name, profile_picture). Endpoints that need the rest of
+    the profile depend on get_current_user_fresh instead.
+    """
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    cached = _token_cache.get(token_key)
+    if cached is not None and cached[0] > time.time():
+        # Copy so a handler changing its user cannot change the cached one
+        return dict(cached[1])
+    
+    _reject_expired_token(token)
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as e:
+        logger.warning("JWT Error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Invalid authentication token: {str(e)}",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    user_id = payload.get("sub")
+    if not user_id or "em" not in payload:
+        # Tokens issued before the user claims were added
+        return await get_current_user_fresh(token)
+    
+    user = {
+        "id": user_id,
+        "_uuid": UUID(user_id),
+        "email": payload["em"],
+        "is_verified": payload.get("v", False),
+        "first_name": payload.get("fn"),
+        "last_name": payload.get("ln"),
+        "profile_picture": payload.get("pp")
+    }
+    _remember_token(token_key, user, min(payload.get("exp", 0), time.time() + TOKEN_CACHE_TTL))
+    return dict(user)
+
+async def get_current_user_fresh(token: str = Depends(oauth2_scheme)):
+    """Get the current authenticated user's full row, from the cache or database."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    _reject_expired_token(token)
     try:
-        # Print token for debugging (first 10 chars)
-        token_preview = token[:10] + "..." if len(token) > 10 else token
-        print(f"Validating token: {token_preview}")
-        
         # Decode JWT token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if not user_id:
-            print("Token missing 'sub' claim")
+            logger.debug("Token missing 'sub' claim")
             raise credentials_exception
             
-        print(f"Token contains user_id: {user_id}")
+        logger.debug("Token contains user_id: %s", user_id)
         
-        # Try to get user from Supabase auth first
-        try:
-            from ....core.supabase import get_supabase_client
-            supabase_client = get_supabase_client()
-            
-            # Try to get user from Supabase auth
-            try:
-                auth_user = supabase_client.auth.admin.get_user_by_id(user_id)
-                print(f"User found in Supabase auth: {auth_user.user.id if auth_user and auth_user.user else 'None'}")
-            except Exception as auth_error:
-                print(f"Error getting user from Supabase auth: {str(auth_error)}")
-                print(f"Error type: {type(auth_error)}")
-                # Continue to database check even if Supabase auth check fails
-        except Exception as client_error:
-            print(f"Error getting Supabase client: {str(client_error)}")
+        # Serve the user from the cache when it was resolved recently. The
+        # token was verified above, so user_id is trusted here.
+        cache_key = _current_user_cache_key(user_id)
+        cached_user = await cache_get(cache_key)
+        if cached_user is not None:
+            cached_user["_uuid"] = UUID(cached_user["id"])
+            return cached_user
     except JWTError as e:
-        print(f"JWT Error: {str(e)}")
+        logger.warning("JWT Error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Invalid authentication token: {str(e)}",
@@ -152,86 +409,86 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     
     # Get user from database
     try:
-        print(f"Querying database for user with ID: {user_id}")
-        user = await execute_query(
-            table="users",
-            query_type="select",
-            filters={"id": user_id}
-        )
+        logger.debug("Querying database for user with ID: %s", user_id)
+        # A burst of requests for one user after a cache miss shares one query
+        user = await _single_flight(f"user:{user_id}", lambda: fetch_user_by_id(user_id))
+        if user is not None:
+            user = dict(user)
         
-        print(f"Database query result: {user}")
+        logger.debug("Database query result: %s", user)
         
-        if not user or len(user) == 0:
-            print(f"User not found in database with ID: {user_id}")
-            
-            # Try to check if user exists in auth.users table directly
-            try:
-                check_query = f"""
-                SELECT id FROM auth.users WHERE id = '{user_id}';
-                """
-                check_result = await execute_raw_sql(check_query)
-                print(f"Auth users check result: {check_result}")
-                
-                if check_result and check_result.get("data") and len(check_result.get("data", [])) > 0:
-                    print(f"User exists in auth.users table but not in our database table")
-                    # This suggests a sync issue between our database and auth.users
-                else:
-                    print(f"User not found in auth.users table either")
-            except Exception as check_error:
-                print(f"Error checking auth.users table: {str(check_error)}")
-            
+        if not user:
+            logger.debug("User not found in database with ID: %s", user_id)
             raise credentials_exception
         
-        print(f"User authenticated: {user[0].get('email')}")
-        return user[0]
+        logger.debug("User authenticated: %s", user.get('email'))
+        
+        # Cache the user until the token expires, capped at CURRENT_USER_CACHE_TTL
+        ttl = min(int(payload.get("exp", 0) - time.time()), CURRENT_USER_CACHE_TTL)
+        if ttl > 0:
+            await cache_set(cache_key, user, ttl)
+        
+        # Parse the id once so handlers don't each re-parse it
+        user["_uuid"] = UUID(user["id"])
+        return user
     except Exception as e:
-        print(f"Database error in get_current_user: {str(e)}")
-        print(f"Error type: {type(e)}")
-        print(f"Error details: {repr(e)}")
+        logger.warning("Database error in get_current_user: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error retrieving user: {str(e)}",
         )
 
+async def get_optional_current_user(token: Optional[str] = Depends(oauth2_scheme_optional)):
+    """Get the current user if a token was sent, otherwise None."""
+    if not token:
+        return None
+    return await get_current_user(token)
+
+# Parameter types for the auth dependencies above
+CurrentUser = Annotated[dict, Depends(get_current_user)]
+FreshCurrentUser = Annotated[dict, Depends(get_current_user_fresh)]
+OptionalCurrentUser = Annotated[Optional[dict], Depends(get_optional_current_user)]
+
 # Routes
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate):
+async def register(user_data: UserCreate, request: Request):
     """Register a new user."""
+    if not await cache_add(f"register:{_client_address(request)}", REGISTER_COOLDOWN):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many registration attempts, please try again shortly"
+        )
+    
     try:
         # Check if user exists
-        existing_user = await execute_query(
-            table="users",
-            query_type="select",
-            filters={"email": user_data.email}
-        )
+        existing_user = await fetch_user_by_email(user_data.email, "id")
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
         
-        # Hash the password
-        hashed_password = pwd_context.hash(user_data.password)
-        
-        # Sign up with Supabase
-        # Sign up with Supabase with retry logic
+        # Sign up with Supabase, retrying only network errors and 5xx responses
+        # with backoff. A 4xx (e.g. the user already exists) won't change on retry.
         supabase = get_supabase_client()
         max_retries = 3
         auth_response = None
         
         for attempt in range(max_retries):
             try:
-                auth_response = supabase.auth.sign_up({
+                auth_response = await asyncio.to_thread(supabase.auth.sign_up, {
                     "email": user_data.email,
                     "password": user_data.password
                 })
-                if auth_response and auth_response.user:
-                    break
+                break
             except Exception as e:
-                print(f"Supabase signup attempt {attempt + 1} failed: {str(e)}")
-                if attempt == max_retries - 1:  # Last attempt
+                logger.warning("Supabase signup attempt %s failed: %s", attempt + 1, e)
+                # Auth errors carry the HTTP status; network failures have none (or 0)
+                status_code = getattr(e, "status", None)
+                retryable = not status_code or status_code >= 500
+                if not retryable or attempt == max_retries - 1:
                     raise
-                continue
+                await asyncio.sleep(0.1 * 2 ** attempt)
         
         if not auth_response or not auth_response.user:
             raise HTTPException(
@@ -240,27 +497,40 @@ async def register(user_data: UserCreate):
             )
             
         # Create user in our database
-        user_data_dict = user_data.dict()
+        now = datetime.now(timezone.utc)
+        # Supabase Auth stores the credential, so the password is not kept here
+        user_data_dict = user_data.model_dump(mode="json", exclude={"password"})
         user_data_dict.update({
             "id": auth_response.user.id,
             "email": auth_response.user.email,
             "is_verified": False,
-            "password": hashed_password,
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
+            "created_at": now,
+            "updated_at": now
         })
         
+        # The unique email index decides between concurrent registrations of the
+        # same address: the losing insert writes nothing and returns no row
         new_user = await execute_query(
             table="users",
-            query_type="insert",
-            data=user_data_dict
+            query_type="upsert",
+            data=user_data_dict,
+            on_conflict="email",
+            ignore_duplicates=True
         )
         
         if not new_user:
+            existing_user = await fetch_user_by_email(user_data.email, "id")
+            if existing_user:
+                # The auth user belongs to the registration that won; keep it
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Email already registered"
+                )
+            
             try:
                 await supabase.auth.admin.delete_user(auth_response.user.id)
             except Exception as cleanup_error:
-                print(f"Failed to cleanup Supabase user: {cleanup_error}")
+                logger.warning("Failed to cleanup Supabase user: %s", cleanup_error)
             
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -274,9 +544,10 @@ async def register(user_data: UserCreate):
             
         return user_response
             
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Registration error: {str(e)}")
-        print(f"Error type: {type(e)}")
+        logger.warning("Registration error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to register user: {str(e)}"
@@ -286,59 +557,70 @@ async def register(user_data: UserCreate):
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Log in a user and return an access token."""
     try:
-        print(f"Login attempt for username: {form_data.username}")
+        logger.debug("Login attempt for username: %s", form_data.username)
         
-        # Get user from database first
-        user = await execute_query(
-            table="users",
-            query_type="select",
-            filters={"email": form_data.username}
+        # The user lookup and the Supabase sign-in don't depend on each other,
+        # so run them side by side. A failed sign-in comes back as the exception.
+        user, auth_response = await asyncio.gather(
+            fetch_user_by_email(form_data.username, LOGIN_COLUMNS),
+            sign_in(form_data.username, form_data.password),
+            return_exceptions=True
         )
+        if isinstance(user, BaseException):
+            raise user
         
         if not user:
-            print(f"No user found with email: {form_data.username}")
+            logger.debug("No user found with email: %s", form_data.username)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials"
             )
         
-        user = user[0]
-        print(f"User found: {user.get('email')}, has password: {'password' in user}")
+        logger.debug("User found: %s, has password: %s", user.get('email'), 'password' in user)
         
         # Check if user is verified
         if not user.get("is_verified"):
-            print(f"User not verified: {user.get('email')}")
+            logger.debug("User not verified: %s", user.get('email'))
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Please verify your email before logging in"
             )
         
-        # Try to authenticate with Supabase first
-        try:
-            auth_response = await sign_in(form_data.username, form_data.password)
-            # If we get here, Supabase auth succeeded
-            print("Supabase authentication successful")
-        except Exception as supabase_error:
-            print(f"Supabase authentication failed: {str(supabase_error)}")
+        # Check the Supabase authentication result first
+        if not isinstance(auth_response, BaseException):
+            logger.debug("Supabase authentication successful")
+        else:
+            logger.warning("Supabase authentication failed: %s", auth_response)
             
-            # Fallback to local password verification
-            if not verify_password(form_data.password, user.get("password", "")):
-                print("Local password verification failed")
+            # Fallback to local password verification. Only older accounts
+            # have a local hash; newer ones are checked by Supabase alone.
+            if not await verify_password(form_data.password, user.get("password", "")):
+                logger.warning("Local password verification failed")
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Invalid credentials"
                 )
-            print("Local password verification successful")
+            logger.debug("Local password verification successful")
+            
+            # Move hashes made with older settings to the current ones
+            if pwd_context.needs_update(user["password"]):
+                await execute_query(
+                    table="users",
+                    query_type="update",
+                    filters={"id": user["id"]},
+                    data={"password": await get_password_hash(form_data.password)},
+                    return_representation=False
+                )
         
         # Create access token
-        access_token = create_access_token(data={"sub": user["id"]})
+        access_token = create_access_token(data=user_token_claims(user))
         return {"access_token": access_token, "token_type": "bearer"}
         
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        logger.warning("Login error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
@@ -367,42 +649,22 @@ async def verify_email(
             )
         
         try:
-            # Get user from database using email
-            user = await execute_query(
-                table="users",
-                query_type="select",
-                filters={"email": email}
-            )
+            # Look the user up and update their verification status in one round trip
+            user_id = await mark_user_verified(email)
             
-            if not user or len(user) == 0:
+            if not user_id:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="User not found"
                 )
             
-            user = user[0]
-            user_id = user["id"]
-            
-            # Update user verification status
-            updated_user = await execute_query(
-                table="users",
-                query_type="update",
-                filters={"id": user_id},
-                data={"is_verified": True, "updated_at": datetime.now().isoformat()}
-            )
-            
-            if not updated_user:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to update user verification status"
-                )
+            await invalidate_current_user_cache(user_id)
             
             # Return success message with a frontend redirect URL if available
-            frontend_url = os.getenv("FRONTEND_URL")
-            if frontend_url:
+            if FRONTEND_URL:
                 return {
                     "message": "Email verified successfully",
-                    "redirect_url": f"{frontend_url}/login"
+                    "redirect_url": f"{FRONTEND_URL}/login"
                 }
             return {"message": "Email verified successfully"}
             
@@ -429,7 +691,7 @@ async def auth_callback(
 ):
     """Handle Supabase auth callback for email verification."""
     try:
-        print(f"Auth callback received: token_hash={token_hash}, type={type}, email={email}")
+        logger.debug("Auth callback received: token_hash=%s, type=%s, email=%s", token_hash, type, email)
         
         if not token_hash or not type:
             raise HTTPException(
@@ -438,8 +700,8 @@ async def auth_callback(
             )
 
         # Get Supabase client
-        from ....core.supabase import get_supabase_client
         supabase = get_supabase_client()
+        frontend_url = FRONTEND_URL or "http://localhost:3000"
         
         try:
             # Verify OTP using the token_hash
@@ -454,42 +716,32 @@ async def auth_callback(
                     detail="Invalid verification token"
                 )
 
-            user_email = verify_response.user.email
-            
             # Update user verification in database
-            updated_user = await execute_query(
-                table="users",
-                query_type="update",
-                filters={"email": user_email},
-                data={
-                    "is_verified": True,
-                    "updated_at": datetime.now().isoformat()
-                }
-            )
+            user_id = await mark_user_verified(verify_response.user.email)
             
-            if not updated_user:
+            if not user_id:
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail="Failed to update verification status"
                 )
+            
+            await invalidate_current_user_cache(user_id)
 
             # Redirect to frontend
-            frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
-            from fastapi.responses import RedirectResponse
             return RedirectResponse(
                 url=f"{frontend_url}/auth/verified?success=true",
                 status_code=status.HTTP_302_FOUND
             )
             
         except Exception as e:
-            print(f"Verification error: {str(e)}")
+            logger.warning("Verification error: %s", e)
             return RedirectResponse(
                 url=f"{frontend_url}/auth/error?message=verification_failed",
                 status_code=status.HTTP_302_FOUND
             )
             
     except Exception as e:
-        print(f"Callback error: {str(e)}")
+        logger.warning("Callback error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Verification failed: {str(e)}"
@@ -513,47 +765,41 @@ async def get_dev_token(
     try:
         # If email is provided, find that user
         if email:
-            user = await execute_query(
-                table="users",
-                query_type="select",
-                filters={"email": email}
-            )
+            user = await fetch_user_by_email(email, TOKEN_COLUMNS)
             
-            if not user or len(user) == 0:
+            if not user:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"User not found with email: {email}"
                 )
-            
-            user = user[0]
         else:
-            # Find any verified user to use
+            # Find any verified user to use; only the token's columns are read
             users = await execute_query(
                 table="users",
                 query_type="select",
                 filters={"is_verified": True},
+                select=TOKEN_COLUMNS,
                 limit=1
             )
             
-            if not users or len(users) == 0:
+            if not users:
                 # If no verified users exist, find any user
                 users = await execute_query(
                     table="users",
                     query_type="select",
+                    select=TOKEN_COLUMNS,
                     limit=1
                 )
                 
-                if not users or len(users) == 0:
-                    # Create a dummy user if no users exist
-                    hashed_password = pwd_context.hash("dummy-password")
-                    
-                    # Generate a UUID for the user
-                    import uuid
-                    user_id = str(uuid.uuid4())
+                if not users:
+                    # Create a dummy user if no users exist. This happens once,
+                    # so the password is only ever hashed on an empty table.
+                    hashed_password = await get_password_hash("dummy-password")
                     
                     # Create dummy user data
+                    now = datetime.now(timezone.utc)
                     dummy_user_data = {
-                        "id": user_id,
+                        "id": str(uuid4()),
                         "email": "dummy@example.com",
                         "password": hashed_password,
                         "first_name": "Dummy",
@@ -566,8 +812,8 @@ async def get_dev_token(
                         "purpose": "try out new dishes",
                         "home_address": "123 Test Street, Test City",
                         "is_verified": True,
-                        "created_at": datetime.now().isoformat(),
-                        "updated_at": datetime.now().isoformat()
+                        "created_at": now,
+                        "updated_at": now
                     }
                     
                     # Insert the dummy user into the database
@@ -577,7 +823,7 @@ async def get_dev_token(
                         data=dummy_user_data
                     )
                     
-                    if not new_user or len(new_user) == 0:
+                    if not new_user:
                         raise HTTPException(
                             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="Failed to create dummy user"
@@ -592,13 +838,13 @@ async def get_dev_token(
         # Create access token with specified expiration
         expires_delta = timedelta(minutes=expires_minutes)
         access_token = create_access_token(
-            data={"sub": user["id"]},
+            data=user_token_claims(user),
             expires_delta=expires_delta
         )
         
         # Log the token generation for audit purposes
-        print(f"TOKEN GENERATED for user {user['email']} (ID: {user['id']})")
-        print(f"Token expires in {expires_minutes} minutes")
+        logger.debug("TOKEN GENERATED for user %s (ID: %s)", user['email'], user['id'])
+        logger.debug("Token expires in %s minutes", expires_minutes)
         
         # Return the token
         return {
@@ -612,36 +858,29 @@ async def get_dev_token(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error generating token: {str(e)}")
+        logger.warning("Error generating token: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate token: {str(e)}"
         )
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_profile(
-    request: Request,
-    current_user: dict = Depends(get_current_user)
-):
+async def get_current_user_profile(current_user: FreshCurrentUser):
     """Get the current user's profile."""
-    # Log the headers request
-    print(f"Request headers: {dict(request.headers)}")
-    print(f"Current user: {current_user}")
-    
     return current_user
 
 @router.patch("/me", response_model=UserResponse)
 async def update_current_user_profile(
     user_update: UserUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: CurrentUser
 ):
     """Update the current user's profile."""
     try:
         # Convert to dict and exclude unset values
-        update_data = user_update.model_dump(exclude_unset=True)
+        update_data = user_update.model_dump(mode="json", exclude_unset=True)
         
         # Add updated timestamp
-        update_data["updated_at"] = datetime.now().isoformat()
+        update_data["updated_at"] = datetime.now(timezone.utc)
 
         # Update user in database
         updated_user = await execute_query(
@@ -656,11 +895,13 @@ async def update_current_user_profile(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to update user profile"
             )
+        
+        await invalidate_current_user_cache(current_user["id"])
             
         return updated_user[0]
         
     except Exception as e:
-        print(f"Error updating user profile: {str(e)}")
+        logger.warning("Error updating user profile: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to update user profile: {str(e)}"
@@ -669,7 +910,7 @@ async def update_current_user_profile(
 @router.post("/me/location", response_model=UserResponse)
 async def update_user_location(
     location: Location,
-    current_user: dict = Depends(get_current_user)
+    current_user: CurrentUser
 ):
     """
     Update the current user's location.
@@ -700,6 +941,9 @@ async def update_user_location(
                 detail="User not found"
             )
         
+        await invalidate_current_user_cache(current_user["id"])
+        await invalidate_nearby_swaps()
+        
         # Return the updated user profile
         updated_user = await get_user_profile(current_user["id"])
         return updated_user
@@ -711,8 +955,8 @@ async def update_user_location(
 
 @router.get("/nearby", response_model=List[UserResponse])
 async def get_nearby_users(
-    radius: float = Query(5.0, description="Search radius in kilometers", ge=0.1, le=50.0),
-    current_user: dict = Depends(get_current_user)
+    current_user: CurrentUser,
+    radius: float = Query(5.0, description="Search radius in kilometers", ge=0.1, le=50.0)
 ):
     """
     Get users near the current user's location.
@@ -744,17 +988,13 @@ async def get_nearby_users(
         
         # Use raw SQL to find nearby users using PostGIS
         # This assumes the database has PostGIS extension enabled
-        # and the users table has a location column of type jsonb
+        # and the users table has the indexed geog column
         query = """
         SELECT *
         FROM users
         WHERE id != %s
-        AND location IS NOT NULL
         AND ST_DWithin(
-            ST_SetSRID(ST_MakePoint(
-                (location->>'longitude')::float,
-                (location->>'latitude')::float
-            ), 4326)::geography,
+            geog,
             ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography,
             %s
         )
@@ -771,7 +1011,7 @@ async def get_nearby_users(
         nearby_users = await execute_raw_sql(query, params)
         
         # Format the response
-        return [format_user_response(user) for user in nearby_users]
+        return [format_user_response(user) for user in nearby_users["data"]]
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -804,28 +1044,26 @@ def format_user_response(user_data):
 # Helper function to get user profile
 async def get_user_profile(user_id):
     """Get user profile by ID"""
-    user_result = await execute_query(
-        table="users",
-        query_type="select",
-        filters={"id": user_id}
-    )
+    user = await fetch_user_by_id(user_id)
     
-    if not user_result or len(user_result) == 0:
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    return format_user_response(user_result[0])
+    return format_user_response(user)
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user_by_id(user_id: UUID4):
     """Get a user's public profile by ID."""
-    user = await execute_query(
-        table="users",
-        query_type="select",
-        filters={"id": str(user_id)}
-    )
+    # Profile changes drop this entry, so a hit is never older than the row
+    cache_key = _current_user_cache_key(str(user_id))
+    user = await cache_get(cache_key)
+    if user is not None:
+        return user
+    
+    user = await fetch_user_by_id(user_id)
     
     if not user:
         raise HTTPException(
@@ -833,7 +1071,8 @@ async def get_user_by_id(user_id: UUID4):
             detail="User not found"
         )
     
-    return user[0]
+    await cache_set(cache_key, user, USER_PROFILE_CACHE_TTL)
+    return user
 
 @router.get("/", response_model=List[UserResponse])
 async def get_users(
@@ -841,16 +1080,22 @@ async def get_users(
     limit: int = Query(10, ge=1, le=100)
 ):
     """Get a list of users."""
-    users = await execute_query(
-        table="users",
-        query_type="select",
-        limit=limit
-    )
+    # Listings aren't invalidated on profile changes, so keep them only briefly
+    cache_key = f"users:list:{skip}:{limit}"
+    cached = await cache_get_bytes(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    
+    users = await fetch_users(limit, skip)
     
-    return users[skip:skip + limit]
+    # USER_COLUMNS matches UserResponse, so send the rows as they are instead
+    # of validating and re-serializing every one
+    body = orjson.dumps(users)
+    await cache_set_bytes(cache_key, body, USER_LIST_CACHE_TTL)
+    return Response(content=body, media_type="application/json")
 
 @router.get("/check-auth")
-async def check_auth(current_user: dict = Depends(get_current_user)):
+async def check_auth(current_user: CurrentUser):
     """
     Check if the current user is authenticated.
     """
@@ -861,19 +1106,14 @@ async def verify_code(email: str = Query(...), code: str = Query(...)):
     """Verify a user's email using the verification code."""
     try:
         # Get user from database
-        user = await execute_query(
-            table="users",
-            query_type="select",
-            filters={"email": email}
-        )
+        user = await fetch_user_by_email(email, "id,is_verified")
         
-        if not user or len(user) == 0:
+        if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
         
-        user = user[0]
         
         # Check if user is already verified
         if user.get("is_verified"):
@@ -894,58 +1134,52 @@ async def verify_code(email: str = Query(...), code: str = Query(...)):
                     detail="Invalid verification code"
                 )
         except Exception as e:
-            print(f"Supabase verification error: {str(e)}")
+            logger.warning("Supabase verification error: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid verification code"
             )
         
         # Update our database
-        updated_user = await execute_query(
-            table="users",
-            query_type="update",
-            filters={"id": user["id"]},
-            data={
-                "is_verified": True,
-                "updated_at": datetime.now().isoformat()
-            }
-        )
-        
-        if not updated_user:
+        if not await mark_user_verified(email):
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to update verification status"
             )
         
+        await invalidate_current_user_cache(user["id"])
+        
         return {"message": "Email verified successfully"}
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Verification error: {str(e)}")
+        logger.warning("Verification error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Verification failed: {str(e)}"
         )
 
 @router.post("/resend-code")
-async def resend_verification_code(email: str = Query(...)):
+async def resend_verification_code(background_tasks: BackgroundTasks, email: str = Query(...)):
     """Resend verification code to user's email."""
+    # Let one resend per address through per cooldown, before any DB or SMTP work
+    if not await cache_add(f"resend:{email.lower()}", RESEND_VERIFICATION_COOLDOWN):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Verification code was sent recently, please wait before requesting another"
+        )
+    
     try:
         # Get user from database
-        user = await execute_query(
-            table="users",
-            query_type="select",
-            filters={"email": email}
-        )
+        user = await fetch_user_by_email(email, "id,is_verified")
         
-        if not user or len(user) == 0:
+        if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
         
-        user = user[0]
         
         # Check if user is already verified
         if user.get("is_verified"):
@@ -955,14 +1189,15 @@ async def resend_verification_code(email: str = Query(...)):
         new_code = generate_verification_code()
         
         # Update user with new verification code
+        now = datetime.now(timezone.utc)
         updated_user = await execute_query(
             table="users",
             query_type="update",
             filters={"id": user["id"]},
             data={
                 "verification_code": new_code,
-                "verification_code_expires": (datetime.now() + timedelta(hours=24)).isoformat(),
-                "updated_at": datetime.now().isoformat()
+                "verification_code_expires": now + timedelta(hours=24),
+                "updated_at": now
             }
         )
         
@@ -972,8 +1207,8 @@ async def resend_verification_code(email: str = Query(...)):
                 detail="Failed to update verification code"
             )
         
-        # Send new verification email
-        await send_verification_email(email, new_code)
+        # Send new verification email after the response goes out
+        background_tasks.add_task(send_verification_email, email, new_code)
         
         return {"message": "Verification code resent successfully"}
         
@@ -0,0 +1,121 @@
+import os
+import logging
+from typing import Any, Optional
+import orjson
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Redis configuration. Caching is disabled when REDIS_URL is not set.
+REDIS_URL = os.getenv("REDIS_URL")
+
+# Global Redis client
+_client: Optional[redis.Redis] = None
+
+
+def get_redis() -> Optional[redis.Redis]:
+    """Get or create the Redis client, or None if caching is disabled"""
+    global _client
+
+    if not REDIS_URL:
+        return None
+
+    if _client is None:
+        _client = redis.from_url(REDIS_URL)
+        logger.info("Created Redis client")
+
+    return _client
+
+
+async def cache_get_bytes(key: str) -> Optional[bytes]:
+    """Get raw bytes from the cache, or None on a miss or any Redis error"""
+    client = get_redis()
+    if client is None:
+        return None
+
+    try:
+        return await client.get(key)
+    except Exception as e:
+        logger.warning("Cache get failed for %s: %s", key, e)
+        return None
+
+
+async def cache_set_bytes(key: str, value: bytes, ttl: int) -> None:
+    """Store raw bytes in the cache with a TTL in seconds"""
+    client = get_redis()
+    if client is None:
+        return
+
+    try:
+        await client.set(key, value, ex=ttl)
+    except Exception as e:
+        logger.warning("Cache set failed for %s: %s", key, e)
+
+
+async def cache_get(key: str) -> Optional[Any]:
+    """Get a JSON value from the cache, or None on a miss or any Redis error"""
+    raw = await cache_get_bytes(key)
+    if raw is None:
+        return None
+    return orjson.loads(raw)
+
+
+async def cache_set(key: str, value: Any, ttl: int) -> None:
+    """Store a JSON value in the cache with a TTL in seconds"""
+    await cache_set_bytes(key, orjson.dumps(value), ttl)
+
+
+async def cache_delete(*keys: str) -> None:
+    """Remove keys from the cache"""
+    client = get_redis()
+    if client is None or not keys:
+        return
+
+    try:
+        await client.delete(*keys)
+    except Exception as e:
+        logger.warning("Cache delete failed for %s: %s", keys, e)
+
+
+async def cache_incr(key: str) -> None:
+    """Increment a counter in the cache, creating it if missing"""
+    client = get_redis()
+    if client is None:
+        return
+
+    try:
+        await client.incr(key)
+    except Exception as e:
+        logger.warning("Cache incr failed for %s: %s", key, e)
+
+
+async def cache_add(key: str, ttl: int) -> bool:
+    """
+    Set a key only if it does not exist yet (SET NX) with a TTL in seconds.
+
+    Returns True if the key was set, False if it already existed. Fails open:
+    returns True when caching is disabled or Redis errors.
+    """
+    client = get_redis()
+    if client is None:
+        return True
+
+    try:
+        return bool(await client.set(key, b"1", nx=True, ex=ttl))
+    except Exception as e:
+        logger.warning("Cache add failed for %s: %s", key, e)
+        return True
+
+
+async def close_cache() -> None:
+    """Close the Redis client on shutdown"""
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,106 @@
+import os
+import asyncio
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+import asyncpg
+import orjson
+from dotenv import load_dotenv
+from .http import WEB_CONCURRENCY
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Direct Postgres connection for hot read paths. When DATABASE_URL is not set,
+# callers fall back to PostgREST through execute_query.
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Pool size is a total for the whole deployment; each worker gets its share
+DB_POOL_MIN_SIZE = max(1, int(os.getenv("DB_POOL_MIN_SIZE", "4")) // WEB_CONCURRENCY)
+DB_POOL_MAX_SIZE = max(DB_POOL_MIN_SIZE, int(os.getenv("DB_POOL_MAX_SIZE", "20")) // WEB_CONCURRENCY)
+
+# asyncpg prepares and caches every statement it runs. Set this to 0 when
+# connecting through a transaction-mode pooler (Supabase port 6543).
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+# Global connection pool, created on first use
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock = asyncio.Lock()
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    """Decode json/jsonb columns to Python values, like PostgREST does"""
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(
+            type_name,
+            encoder=lambda value: orjson.dumps(value).decode(),
+            decoder=orjson.loads,
+            schema="pg_catalog"
+        )
+
+
+async def get_db_pool() -> Optional[asyncpg.Pool]:
+    """Get or create the connection pool, or None if DATABASE_URL is not set"""
+    global _pool
+
+    if not DATABASE_URL:
+        return None
+
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    dsn=DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+                    init=_init_connection
+                )
+                logger.info(
+                    "Created database pool with %d-%d connections",
+                    DB_POOL_MIN_SIZE,
+                    DB_POOL_MAX_SIZE
+                )
+
+    return _pool
+
+
+def _to_json_value(value: Any) -> Any:
+    """Convert a value the way PostgREST would render it in JSON"""
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _record_to_dict(record: asyncpg.Record) -> Dict[str, Any]:
+    """Turn a row into the same dict shape execute_query returns"""
+    return {key: _to_json_value(value) for key, value in record.items()}
+
+
+async def db_fetch(query: str, *args: Any) -> List[Dict[str, Any]]:
+    """Run a query on the pool and return all rows as dicts"""
+    pool = await get_db_pool()
+    rows = await pool.fetch(query, *args)
+    return [_record_to_dict(row) for row in rows]
+
+
+async def db_fetchrow(query: str, *args: Any) -> Optional[Dict[str, Any]]:
+    """Run a query on the pool and return the first row as a dict, or None"""
+    pool = await get_db_pool()
+    row = await pool.fetchrow(query, *args)
+    return _record_to_dict(row) if row is not None else None
+
+
+async def close_db_pool() -> None:
+    """Close the connection pool on shutdown"""
+    global _pool
+
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -34,6 +34,9 @@ USE_DATASTAX_LLM_ONLY = os.getenv("USE_DATASTAX_LLM_ONLY", "False").lower() == "
 _cluster = None
 _session = None
 
+# Prepared statements keyed by CQL text, bound to the global session
+_prepared_statements: Dict[str, Any] = {}
+
 
 def get_cluster():
     """Get or create the Cassandra cluster connection"""
@@ -92,7 +95,7 @@ def get_session():
         cluster = get_cluster()
         if cluster:
             _session = cluster.connect(ASTRA_DB_KEYSPACE)
-            logger.info(f"Connected to keyspace: {ASTRA_DB_KEYSPACE}")
+            logger.info("Connected to keyspace: %s", ASTRA_DB_KEYSPACE)
     
     return _session
 
@@ -102,7 +105,7 @@ def run_async(f):
     @wraps(f)
     async def wrapper(*args, **kwargs):
         if USE_DATASTAX_LLM_ONLY:
-            logger.info(f"Skipping Cassandra operation {f.__name__} (LLM-only mode)")
+            logger.info("Skipping Cassandra operation %s (LLM-only mode)", f.__name__)
             return []
         return await asyncio.to_thread(f, *args, **kwargs)
     return wrapper
@@ -232,35 +235,37 @@ def save_user_profile(
     return True
 
 
-@run_async
-def get_food_recommendations(search_term: str, user_id: Optional[UUID] = None, limit: int = 10):
+def _prepare(session, query: str):
+    """Prepare a CQL statement once per session and reuse it on later calls"""
+    statement = _prepared_statements.get(query)
+    if statement is None:
+        statement = session.prepare(query)
+        _prepared_statements[query] = statement
+    return statement
+
+
+def _search_food_items(session, search_term: str, limit: int) -> Dict[str, Any]:
     """
-    Get food recommendations based on search term and optionally user preferences
-    
+    Run the cuisine / ingredient / general search against the food tables.
+
     This is a simplified implementation. In a production system, you would:
     1. Use more sophisticated matching algorithms
     2. Implement proper text search (possibly with a search engine like Elasticsearch)
     3. Consider user preferences more deeply
     """
-    session = get_session()
-    
+    term = search_term.lower()
+
     # Start with a basic search by cuisine type
-    cuisine_query = """
-    SELECT * FROM food_by_cuisine 
-    WHERE cuisine_type = %s 
-    LIMIT %s
-    """
-    
-    cuisine_results = session.execute(cuisine_query, (search_term.lower(), limit))
+    cuisine_results = session.execute(
+        _prepare(session, "SELECT * FROM food_by_cuisine WHERE cuisine_type = ? LIMIT ?"),
+        (term, limit)
+    )
     
     # If we don't have enough results, search by ingredient
-    ingredient_query = """
-    SELECT * FROM food_by_ingredient 
-    WHERE ingredient = %s 
-    LIMIT %s
-    """
-    
-    ingredient_results = session.execute(ingredient_query, (search_term.lower(), limit))
+    ingredient_results = session.execute(
+        _prepare(session, "SELECT * FROM food_by_ingredient WHERE ingredient = ? LIMIT ?"),
+        (term, limit)
+    )
     
     # Combine and deduplicate results
     results = []
@@ -281,14 +286,12 @@ def get_food_recommendations(search_term: str, user_id: Optional[UUID] = None, l
             })
     
     # Process ingredient results
+    food_query = _prepare(session, "SELECT * FROM food_items WHERE food_id = ?")
     for row in ingredient_results:
         if row.food_id not in food_ids and len(results) < limit:
             food_ids.add(row.food_id)
             
             # Get full food details
-            food_query = """
-            SELECT * FROM food_items WHERE food_id = %s
-            """
             food_details = session.execute(food_query, (row.food_id,)).one()
             
             results.append({
@@ -304,18 +307,18 @@ def get_food_recommendations(search_term: str, user_id: Optional[UUID] = None, l
     # If we still don't have enough results, do a more general search
     if len(results) < limit:
         # Get additional food items
-        general_query = """
-        SELECT * FROM food_items LIMIT %s
-        """
-        general_results = session.execute(general_query, (limit,))
+        general_results = session.execute(
+            _prepare(session, "SELECT * FROM food_items LIMIT ?"),
+            (limit,)
+        )
         
         for row in general_results:
             if row.food_id not in food_ids and len(results) < limit:
                 food_ids.add(row.food_id)
                 
                 # Calculate a simple match score based on text similarity
-                name_match = search_term.lower() in row.name.lower() if row.name else False
-                desc_match = search_term.lower() in row.description.lower() if row.description else False
+                name_match = term in row.name.lower() if row.name else False
+                desc_match = term in row.description.lower() if row.description else False
                 
                 match_score = 0.5  # Base score
                 if name_match:
@@ -343,6 +346,25 @@ def get_food_recommendations(search_term: str, user_id: Optional[UUID] = None, l
     }
 
 
+@run_async
+def get_food_recommendations(search_term: str, user_id: Optional[UUID] = None, limit: int = 10):
+    """Get food recommendations based on search term and optionally user preferences"""
+    session = get_session()
+    return _search_food_items(session, search_term, limit)
+
+
+@run_async
+def get_food_recommendations_anon(search_term: str, limit: int = 10):
+    """
+    Get food recommendations for anonymous callers.
+
+    Skips everything that depends on a user and goes straight to the
+    prepared search statements.
+    """
+    session = get_session()
+    return _search_food_items(session, search_term, limit)
+
+
 # Initialize connection and tables on module import
 async def initialize_datastax():
     """Initialize DataStax connection and create tables"""
@@ -354,5 +376,5 @@ async def initialize_datastax():
         await create_tables()
         logger.info("DataStax initialization complete")
     except Exception as e:
-        logger.error(f"Error initializing DataStax: {e}")
+        logger.error("Error initializing DataStax: %s", e)
         raise 
\ No newline at end of file
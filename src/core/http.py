@@ -0,0 +1,55 @@
+import os
+import logging
+from typing import Optional
+import httpx
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Number of worker processes the app is served with (gunicorn reads the same
+# variable), so the connection budget can be split between them
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "4")))
+
+# Connection pool settings for outbound HTTP (Supabase REST, Langflow). The
+# limits are totals for the whole deployment; each worker gets its share.
+HTTP_MAX_CONNECTIONS = max(1, int(os.getenv("HTTP_MAX_CONNECTIONS", "100")) // WEB_CONCURRENCY)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = max(1, int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "50")) // WEB_CONCURRENCY)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+
+# Global HTTP client, shared by every request in this process
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get or create the shared, connection-pooled HTTP client"""
+    global _client
+
+    if _client is None:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            http2=True,
+            timeout=HTTP_TIMEOUT
+        )
+        logger.info(
+            "Created shared HTTP client with %d connections (%d keep-alive)",
+            HTTP_MAX_CONNECTIONS,
+            HTTP_MAX_KEEPALIVE_CONNECTIONS
+        )
+
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client on shutdown"""
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+from .supabase import execute_query
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class BatchLoader:
+    """
+    Coalesce lookups of single rows by key into one query.
+
+    Every load() issued during the same event loop tick is collected, then a
+    single id=in.(...) select fetches all of them on the next tick. Concurrent
+    loads of the same key share one result. Nothing is cached once the batch
+    resolves, so later loads always see fresh rows.
+    """
+
+    def __init__(self, table: str, key: str = "id", select: str = "*"):
+        self.table = table
+        self.key = key
+        self.select = select
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, key: Any) -> Optional[Dict[str, Any]]:
+        """Get the row with the given key, or None if it does not exist"""
+        key = str(key)
+        future = self._pending.get(key)
+
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._pending:
+                loop.call_soon(self._dispatch)
+            future = loop.create_future()
+            self._pending[key] = future
+
+        # A cancelled caller must not cancel the result for the others
+        return await asyncio.shield(future)
+
+    def _dispatch(self) -> None:
+        batch, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._fetch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, batch: Dict[str, asyncio.Future]) -> None:
+        try:
+            rows = await execute_query(
+                table=self.table,
+                query_type="select",
+                filters={self.key: {"in": list(batch)}},
+                select=self.select
+            )
+        except Exception as e:
+            logger.warning("Batch load from %s failed: %s", self.table, e)
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        rows_by_key = {str(row[self.key]): row for row in rows or []}
+        logger.debug("Loaded %d of %d %s rows in one batch", len(rows_by_key), len(batch), self.table)
+
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(rows_by_key.get(key))
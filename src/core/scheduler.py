@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any, Optional
 from .supabase import execute_query, execute_raw_sql
 
@@ -51,12 +51,8 @@ async def check_nearby_foods():
                 SELECT id
                 FROM users
                 WHERE id != %s
-                AND location IS NOT NULL
                 AND ST_DWithin(
-                    ST_SetSRID(ST_MakePoint(
-                        (location->>'longitude')::float,
-                        (location->>'latitude')::float
-                    ), 4326)::geography,
+                    geog,
                     ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography,
                     %s
                 )
@@ -96,44 +92,46 @@ async def check_nearby_foods():
                     logger.info(f"No new nearby foods found for user {user_id}")
                     continue
                 
-                # Create notifications for new foods
-                notifications_created = 0
+                # Skip foods the user was already notified about
+                foods = foods_result["data"]
+                existing_notifications = await execute_query(
+                    table="notifications",
+                    query_type="select",
+                    filters={
+                        "user_id": user_id,
+                        "type": "nearby_food",
+                        "related_id": {"in": [food["id"] for food in foods]}
+                    },
+                    select="related_id"
+                )
+                notified_food_ids = {notification["related_id"] for notification in existing_notifications or []}
                 
-                for food in foods_result["data"]:
-                    # Check if notification already exists
-                    existing_notification = await execute_query(
-                        table="notifications",
-                        query_type="select",
-                        filters={
-                            "user_id": user_id,
-                            "type": "nearby_food",
-                            "related_id": food["id"]
-                        }
-                    )
-                    
-                    if existing_notification and len(existing_notification) > 0:
-                        # Notification already exists, skip
-                        continue
-                    
-                    # Create notification
-                    notification_data = {
+                # Create all new notifications for this user with a single insert
+                now = datetime.now().isoformat()
+                new_notifications = [
+                    {
                         "user_id": user_id,
                         "type": "nearby_food",
                         "title": "New Food Nearby",
                         "message": f"{food['first_name']} {food['last_name']} added {food['name']} near you!",
                         "related_id": food["id"],
                         "is_read": False,
-                        "created_at": datetime.now().isoformat(),
-                        "updated_at": datetime.now().isoformat()
+                        "created_at": now,
+                        "updated_at": now
                     }
-                    
+                    for food in foods
+                    if food["id"] not in notified_food_ids
+                ]
+                
+                if new_notifications:
                     await execute_query(
                         table="notifications",
                         query_type="insert",
-                        data=notification_data
+                        data=new_notifications,
+                        return_representation=False
                     )
-                    
-                    notifications_created += 1
+                
+                notifications_created = len(new_notifications)
                 
                 logger.info(f"Created {notifications_created} notifications for user {user_id}")
                 
@@ -157,7 +155,7 @@ async def check_expiring_foods():
         logger.info("Starting expiring foods check")
         
         # Find foods that expire in the next 24 hours
-        tomorrow = datetime.now() + timedelta(days=1)
+        tomorrow = datetime.now(timezone.utc) + timedelta(days=1)
         
         expiring_foods_query = """
         SELECT f.*, u.first_name, u.last_name
@@ -168,7 +166,7 @@ async def check_expiring_foods():
         AND f.is_available = true
         """
         
-        expiring_foods_params = [tomorrow.isoformat()]
+        expiring_foods_params = [tomorrow]
         
         expiring_foods_result = await execute_raw_sql(expiring_foods_query, expiring_foods_params)
         
@@ -178,46 +176,48 @@ async def check_expiring_foods():
         
         logger.info(f"Found {len(expiring_foods_result['data'])} expiring foods")
         
-        # Create notifications for expiring foods
-        notifications_created = 0
-        
-        for food in expiring_foods_result["data"]:
-            user_id = food["user_id"]
-            
-            # Check if notification already exists
-            existing_notification = await execute_query(
-                table="notifications",
-                query_type="select",
-                filters={
-                    "user_id": user_id,
-                    "type": "food_expiring",
-                    "related_id": food["id"]
-                }
-            )
-            
-            if existing_notification and len(existing_notification) > 0:
-                # Notification already exists, skip
-                continue
-            
-            # Create notification
-            notification_data = {
-                "user_id": user_id,
+        # Skip foods whose owners were already notified
+        foods = expiring_foods_result["data"]
+        existing_notifications = await execute_query(
+            table="notifications",
+            query_type="select",
+            filters={
+                "type": "food_expiring",
+                "related_id": {"in": [food["id"] for food in foods]}
+            },
+            select="user_id,related_id"
+        )
+        notified = {
+            (notification["user_id"], notification["related_id"])
+            for notification in existing_notifications or []
+        }
+        
+        # Create all new notifications with a single insert
+        now = datetime.now().isoformat()
+        new_notifications = [
+            {
+                "user_id": food["user_id"],
                 "type": "food_expiring",
                 "title": "Food Expiring Soon",
                 "message": f"Your {food['name']} is expiring soon!",
                 "related_id": food["id"],
                 "is_read": False,
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
+                "created_at": now,
+                "updated_at": now
             }
-            
+            for food in foods
+            if (food["user_id"], food["id"]) not in notified
+        ]
+        
+        if new_notifications:
             await execute_query(
                 table="notifications",
                 query_type="insert",
-                data=notification_data
+                data=new_notifications,
+                return_representation=False
             )
-            
-            notifications_created += 1
+        
+        notifications_created = len(new_notifications)
         
         logger.info(f"Created {notifications_created} notifications for expiring foods")
         
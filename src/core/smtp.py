@@ -0,0 +1,97 @@
+import os
+import asyncio
+import logging
+from email.message import Message
+from typing import Optional
+import aiosmtplib
+from dotenv import load_dotenv
+from .http import WEB_CONCURRENCY
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# SMTP settings
+EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.example.com")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
+EMAIL_USERNAME = os.getenv("EMAIL_USERNAME", "")
+EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "")
+EMAIL_TIMEOUT = float(os.getenv("EMAIL_TIMEOUT", "30"))
+
+# Providers cap concurrent sessions per account, so the pool size is a total
+# for the whole deployment; each worker gets its share
+EMAIL_POOL_SIZE = max(1, int(os.getenv("EMAIL_POOL_SIZE", "5")) // WEB_CONCURRENCY)
+
+# Idle SMTP clients, kept logged in between emails. SMTP is a sequential
+# protocol, so each send takes a client out of the queue for its duration.
+# Slots start empty (None) and are connected on first use.
+_idle_clients: "asyncio.Queue[Optional[aiosmtplib.SMTP]]" = asyncio.Queue()
+for _ in range(EMAIL_POOL_SIZE):
+    _idle_clients.put_nowait(None)
+
+
+async def _connect() -> aiosmtplib.SMTP:
+    """Open a new connection and do STARTTLS and LOGIN once"""
+    client = aiosmtplib.SMTP(
+        hostname=EMAIL_HOST,
+        port=EMAIL_PORT,
+        start_tls=True,
+        username=EMAIL_USERNAME or None,
+        password=EMAIL_PASSWORD or None,
+        timeout=EMAIL_TIMEOUT
+    )
+    await client.connect()
+    logger.info("Connected to SMTP server %s:%d", EMAIL_HOST, EMAIL_PORT)
+    return client
+
+
+async def send_email(message: Message) -> None:
+    """
+    Send a message over a pooled SMTP connection.
+
+    Connections are opened on first use and reused afterwards. A NOOP checks
+    that an idle connection is still usable before sending; one the server has
+    dropped is reopened, and a send that still fails on it is retried once.
+    """
+    client = await _idle_clients.get()
+    try:
+        if client is not None and client.is_connected:
+            try:
+                await client.noop()
+            except aiosmtplib.SMTPException as e:
+                logger.info("SMTP connection failed its health check (%s), reconnecting", e)
+                client.close()
+                client = None
+
+        if client is None or not client.is_connected:
+            client = await _connect()
+
+        try:
+            await client.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            logger.info("SMTP connection was closed by the server, reconnecting")
+            client.close()
+            client = await _connect()
+            await client.send_message(message)
+    finally:
+        # Hand the slot back even when the send failed; a broken client is
+        # caught by the health check on its next use
+        _idle_clients.put_nowait(client)
+
+
+async def close_smtp_client() -> None:
+    """Close the pooled SMTP connections on shutdown"""
+    clients = []
+    while not _idle_clients.empty():
+        clients.append(_idle_clients.get_nowait())
+
+    for client in clients:
+        if client is not None:
+            try:
+                if client.is_connected:
+                    await client.quit()
+            except aiosmtplib.SMTPException as e:
+                logger.warning("Failed to close SMTP connection cleanly: %s", e)
+        _idle_clients.put_nowait(None)
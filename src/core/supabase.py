@@ -1,13 +1,21 @@
 import os
-from typing import Optional, Dict, Any
+import asyncio
+import logging
+import re
+import itertools
+from typing import Optional, Dict, Any, List, Tuple, Union
 from supabase import create_client, Client
 from dotenv import load_dotenv
-import httpx
 from datetime import datetime
+from .http import get_http_client
+from .database import get_db_pool, db_fetch
 
 # Load environment variables
 load_dotenv()
 
+# Configure logging
+logger = logging.getLogger(__name__)
+
 # Supabase configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
@@ -21,10 +29,10 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 # Create Supabase client with default settings
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-# Print Supabase configuration for debugging
-print(f"Supabase URL: {SUPABASE_URL}")
-print(f"API URL: {API_URL}")
-print(f"Callback URL: {API_URL}/api/v1/users/callback")
+# Log Supabase configuration for debugging
+logger.info("Supabase URL: %s", SUPABASE_URL)
+logger.info("API URL: %s", API_URL)
+logger.info("Callback URL: %s/api/v1/users/callback", API_URL)
 
 # Helper function to verify tokens
 async def verify_token(token: str, type: str = "signup") -> Dict[str, Any]:
@@ -39,8 +47,7 @@ async def verify_token(token: str, type: str = "signup") -> Dict[str, Any]:
         The verification response
     """
     try:
-        print(f"Verifying token of type {type}")
-        print(f"Token: {token[:10]}... (truncated)")
+        logger.debug("Verifying token of type %s", type)
         
         verify_params = {
             "token": token,
@@ -48,14 +55,10 @@ async def verify_token(token: str, type: str = "signup") -> Dict[str, Any]:
         }
         
         response = supabase.auth.verify_otp(verify_params)
-        print(f"Verification response type: {type(response)}")
-        print(f"Verification response attributes: {dir(response)}")
         
         return response
     except Exception as e:
-        print(f"Error verifying token: {str(e)}")
-        print(f"Error type: {type(e)}")
-        print(f"Error details: {repr(e)}")
+        logger.warning("Error verifying token: %s", e)
         raise e
 
 def serialize_datetime(obj):
@@ -64,168 +67,248 @@ def serialize_datetime(obj):
         return obj.isoformat()
     return obj
 
+# Filter operators accepted in execute_query filter dicts, mapped to PostgREST
+FILTER_OPERATORS = {
+    "eq": "eq",
+    "neq": "neq",
+    "$ne": "neq",
+    "gt": "gt",
+    "gte": "gte",
+    "lt": "lt",
+    "lte": "lte",
+    "in": "in",
+    "like": "like",
+    "ilike": "ilike",
+    "not_ilike": "not.ilike",
+    "is": "is",
+    "cs": "cs",
+}
+
+def _format_filter_value(value: Any) -> str:
+    """Format a Python value the way PostgREST expects it in a filter."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(serialize_datetime(value))
+
+def contains_pattern(text: str) -> str:
+    """
+    Build a like/ilike pattern matching text anywhere, taken literally.
+    
+    LIKE metacharacters in text are escaped. PostgREST turns every * into %
+    and has no escape for it, so a * in text matches any single character.
+    """
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("*", "_")
+    return f"*{escaped}*"
+
+def _format_in_value(value: Any, reserved: str = ',()" ') -> str:
+    """Format a single item of an in.(...) list, quoting reserved characters."""
+    formatted = _format_filter_value(value)
+    if any(char in formatted for char in reserved):
+        formatted = '"' + formatted.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return formatted
+
+# Characters that must be quoted in values inside or=(...) and and=(...)
+LOGIC_RESERVED_CHARS = ',.:()" '
+
+def _filter_conditions(key: str, value: Any, in_logic: bool = False) -> List[Tuple[str, str]]:
+    """
+    Translate one execute_query filter into (column, "operator.value") pairs.
+    
+    Inside or/and groups, values with reserved characters (such as the dots
+    and colons of a timestamp) are quoted.
+    """
+    if not isinstance(value, dict):
+        value = {"is": None} if value is None else {"eq": value}
+    
+    conditions = []
+    for operator, operand in value.items():
+        pg_operator = FILTER_OPERATORS.get(operator)
+        if pg_operator is None:
+            raise ValueError(f"Unsupported filter operator: {operator}")
+        
+        if pg_operator == "in":
+            items = ",".join(_format_in_value(item) for item in operand)
+            conditions.append((key, f"in.({items})"))
+        elif pg_operator == "cs":
+            # Array contains: the operand is a list, sent as an array literal
+            items = ",".join(_format_in_value(item) for item in operand)
+            conditions.append((key, f"cs.{{{items}}}"))
+        elif operand is None and pg_operator in ("eq", "is"):
+            conditions.append((key, "is.null"))
+        elif operand is None and pg_operator == "neq":
+            conditions.append((key, "not.is.null"))
+        elif in_logic:
+            conditions.append((key, f"{pg_operator}.{_format_in_value(operand, LOGIC_RESERVED_CHARS)}"))
+        else:
+            conditions.append((key, f"{pg_operator}.{_format_filter_value(operand)}"))
+    return conditions
+
+def _logic_conditions(filters: Dict[str, Any]) -> List[str]:
+    """Translate the filters of an or/and group, including nested groups."""
+    conditions = []
+    for key, value in filters.items():
+        if key in ("or", "and"):
+            conditions.append(f"{key}({','.join(_logic_conditions(value))})")
+        else:
+            conditions.extend(
+                f"{name}.{condition}"
+                for name, condition in _filter_conditions(key, value, in_logic=True)
+            )
+    return conditions
+
+def build_filter_params(filters: Optional[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """
+    Translate execute_query filters into PostgREST query parameters.
+    
+    Plain values are equality filters. Dict values map operators to operands,
+    e.g. {"user_id": {"neq": user_id}}, {"id": {"in": food_ids}} or
+    {"dietary_requirements": {"cs": ["vegan"]}} for array columns. The "or"
+    key takes a dict of filters of which any may match, e.g.
+    {"or": {"requester_id": user_id, "provider_id": user_id}}, and "and" a
+    dict of which all must match. Both can be nested inside each other.
+    """
+    params = []
+    for key, value in (filters or {}).items():
+        if key in ("or", "and"):
+            params.append((key, f"({','.join(_logic_conditions(value))})"))
+        else:
+            params.extend(_filter_conditions(key, value))
+    return params
+
+def _rest_headers(prefer: Optional[str] = None) -> Dict[str, str]:
+    """Headers for direct PostgREST requests."""
+    headers = {
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+        "Content-Type": "application/json",
+    }
+    if prefer:
+        headers["Prefer"] = prefer
+    return headers
+
+def _serialize_value(value: Any) -> Any:
+    """Convert a value to something JSON serializable for a PostgREST body."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    # Handle URL objects specifically
+    if 'Url' in type(value).__name__ or 'URL' in type(value).__name__:
+        return str(value)
+    if isinstance(value, list):
+        return [_serialize_value(item) for item in value]
+    if hasattr(value, '__dict__'):  # Custom objects
+        return str(value)
+    return value
+
+def _serialize_row(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Serialize a row to insert or update."""
+    return {key: _serialize_value(value) for key, value in data.items()}
+
 # Helper functions for database operations
 async def execute_query(
     table: str, 
     query_type: str, 
-    data: Optional[Dict[str, Any]] = None, 
+    data: Optional[Union[Dict[str, Any], List[Dict[str, Any]]]] = None, 
     filters: Optional[Dict[str, Any]] = None,
     select: str = "*",
     limit: Optional[int] = None,
     order_by: Optional[Dict[str, str]] = None,
-    joins: Optional[list] = None
+    joins: Optional[list] = None,
+    offset: Optional[int] = None,
+    on_conflict: Optional[str] = None,
+    ignore_duplicates: bool = False,
+    return_representation: bool = True
 ):
     """
     Execute a query on the Supabase database.
     
     Args:
         table: The table to query
-        query_type: The type of query (select, insert, update, delete)
-        data: The data to insert or update
+        query_type: The type of query (select, insert, upsert, update, delete)
+        data: The data to insert or update. Inserts also accept a list of rows,
+            which are written with a single request
         filters: The filters to apply to the query
         select: The columns to select
         limit: The maximum number of rows to return
         order_by: The columns to order by
         joins: The tables to join
+        offset: The number of rows to skip before returning results
+        on_conflict: For upserts, the unique column(s) that identify an existing row
+        ignore_duplicates: For upserts, leave existing rows untouched instead of
+            merging the new values into them. Only newly inserted rows are returned
+        return_representation: For writes, whether PostgREST should send the
+            written rows back. Pass False when the result is not used; the
+            call then returns None
         
     Returns:
         The result of the query
     """
     try:
-        # Log the operation for debugging
-        print(f"Executing {query_type} on table {table}")
-        print(f"Filters: {filters}")
-        print(f"Data: {data}")
+        logger.debug("Executing %s on table %s (filters=%s)", query_type, table, filters)
         
-        # Get the base query builder
-        query = supabase.table(table)
+        # Writes only send the affected rows back when the caller wants them
+        returning = "return=representation" if return_representation else "return=minimal"
         
         if query_type == "select":
-            # Start with a basic select
-            query = query.select(select)
+            # Push filters, ordering and pagination down to PostgREST so only
+            # the requested page comes back over the wire
+            params = [("select", select)] + build_filter_params(filters)
             
-            # Execute the query without any filters or options first
-            # This is to check if the basic functionality works
-            try:
-                result = query.execute()
-                print("Basic select query executed successfully")
-                
-                # If we have filters, we need to filter the results manually
-                if filters:
-                    filtered_data = []
-                    for item in result.data:
-                        include_item = True
-                        for key, value in filters.items():
-                            if isinstance(value, dict):
-                                # Complex filters not supported in this basic implementation
-                                # Just use equality for now
-                                operator = list(value.keys())[0]
-                                if operator == "eq" and item.get(key) != value[operator]:
-                                    include_item = False
-                                    break
-                            elif item.get(key) != value:
-                                include_item = False
-                                break
-                        if include_item:
-                            filtered_data.append(item)
-                    
-                    # Apply limit if provided
-                    if limit and len(filtered_data) > limit:
-                        filtered_data = filtered_data[:limit]
-                    
-                    # Apply order by if provided
-                    if order_by:
-                        for key, direction in order_by.items():
-                            reverse = direction.lower() == "desc"
-                            filtered_data.sort(key=lambda x: x.get(key, ""), reverse=reverse)
-                    
-                    return filtered_data
-                else:
-                    # Apply limit if provided
-                    if limit and len(result.data) > limit:
-                        return result.data[:limit]
-                    return result.data
-                
-            except Exception as select_e:
-                print(f"Basic select query failed: {select_e}")
-                raise select_e
+            if order_by:
+                params.append((
+                    "order",
+                    ",".join(f"{key}.{direction.lower()}" for key, direction in order_by.items())
+                ))
+            
+            if limit:
+                params.append(("limit", str(limit)))
+            
+            if offset:
+                params.append(("offset", str(offset)))
+            
+            response = await get_http_client().get(
+                f"{SUPABASE_URL}/rest/v1/{table}",
+                params=params,
+                headers=_rest_headers()
+            )
+            response.raise_for_status()
+            return response.json()
             
         elif query_type == "insert":
             if not data:
                 raise ValueError("Data is required for insert operations")
             
-            data = {key: serialize_datetime(value) for key, value in data.items()}
-
-            try:
-                # Try the standard insert method
-                result = query.insert(data).execute()
-                print("Insert operation successful")
-                return result.data
-            except Exception as insert_e:
-                print(f"Insert operation failed: {insert_e}")
-                
-                # Try a direct HTTP request as a last resort
-                try:
-                    import httpx
-                    import json
-                    from datetime import datetime
-                    
-                    # Get the Supabase URL and key from the client
-                    supabase_url = SUPABASE_URL
-                    supabase_key = SUPABASE_KEY
-                    
-                    # Construct the URL for the table
-                    url = f"{supabase_url}/rest/v1/{table}"
-                    
-                    # Set up the headers
-                    headers = {
-                        "apikey": supabase_key,
-                        "Authorization": f"Bearer {supabase_key}",
-                        "Content-Type": "application/json",
-                        "Prefer": "return=representation"
-                    }
-                    
-                    # Serialize the data to handle non-JSON serializable objects
-                    serialized_data = {}
-                    for key, value in data.items():
-                        # Handle different types of values
-                        if isinstance(value, datetime):
-                            serialized_data[key] = value.isoformat()
-                        # Handle URL objects specifically
-                        elif str(type(value)).find('Url') != -1 or str(type(value)).find('URL') != -1:
-                            serialized_data[key] = str(value)
-                        elif hasattr(value, '__dict__'):  # Custom objects
-                            serialized_data[key] = str(value)
-                        # Handle lists of objects
-                        elif isinstance(value, list):
-                            serialized_list = []
-                            for item in value:
-                                if isinstance(item, datetime):
-                                    serialized_list.append(item.isoformat())
-                                elif str(type(item)).find('Url') != -1 or str(type(item)).find('URL') != -1:
-                                    serialized_list.append(str(item))
-                                elif hasattr(item, '__dict__'):
-                                    serialized_list.append(str(item))
-                                else:
-                                    serialized_list.append(item)
-                            serialized_data[key] = serialized_list
-                        else:
-                            serialized_data[key] = value
-                    
-                    # Print the serialized data for debugging
-                    print(f"Serialized data: {serialized_data}")
-                    
-                    # Make the request
-                    response = httpx.post(url, json=serialized_data, headers=headers)
-                    response.raise_for_status()
-                    
-                    print("Insert operation successful using direct HTTP request")
-                    return response.json()
-                except Exception as http_e:
-                    print(f"Direct HTTP insert request failed: {http_e}")
-                    print(f"Error type: {type(http_e)}")
-                    print(f"Error details: {repr(http_e)}")
-                    raise http_e
+            # Return the inserted rows, when wanted, so callers need no follow-up read
+            response = await get_http_client().post(
+                f"{SUPABASE_URL}/rest/v1/{table}",
+                json=[_serialize_row(row) for row in data] if isinstance(data, list) else _serialize_row(data),
+                headers=_rest_headers(returning)
+            )
+            response.raise_for_status()
+            
+            logger.debug("Insert operation successful")
+            return response.json() if return_representation else None
+            
+        elif query_type == "upsert":
+            if not data:
+                raise ValueError("Data is required for upsert operations")
+            
+            if not on_conflict:
+                raise ValueError("on_conflict is required for upsert operations")
+            
+            # INSERT ... ON CONFLICT in one request, returning the written rows
+            resolution = "ignore-duplicates" if ignore_duplicates else "merge-duplicates"
+            response = await get_http_client().post(
+                f"{SUPABASE_URL}/rest/v1/{table}",
+                params={"on_conflict": on_conflict},
+                json=[_serialize_row(row) for row in data] if isinstance(data, list) else _serialize_row(data),
+                headers=_rest_headers(f"resolution={resolution},{returning}")
+            )
+            response.raise_for_status()
+            
+            logger.debug("Upsert operation successful")
+            return response.json() if return_representation else None
             
         elif query_type == "update":
             if not data:
@@ -234,156 +317,53 @@ async def execute_query(
             if not filters:
                 raise ValueError("Filters are required for update operations")
             
-            try:
-                # Try the standard update method
-                # We'll need to construct a query string for the filters
-                filter_params = []
-                for key, value in filters.items():
-                    if isinstance(value, dict):
-                        # Complex filters not supported in this basic implementation
-                        # Just use equality for now
-                        operator = list(value.keys())[0]
-                        if operator == "eq":
-                            filter_params.append(f"{key}=eq.{value[operator]}")
-                    else:
-                        filter_params.append(f"{key}=eq.{value}")
-                
-                # Construct the URL for the table with filters
-                import httpx
-                import json
-                from datetime import datetime
-                
-                # Get the Supabase URL and key from the client
-                supabase_url = SUPABASE_URL
-                supabase_key = SUPABASE_KEY
-                
-                # Construct the URL for the table with filters
-                url = f"{supabase_url}/rest/v1/{table}?{('&'.join(filter_params))}"
-                
-                # Set up the headers
-                headers = {
-                    "apikey": supabase_key,
-                    "Authorization": f"Bearer {supabase_key}",
-                    "Content-Type": "application/json",
-                    "Prefer": "return=representation"
-                }
-                
-                # Serialize the data to handle non-JSON serializable objects
-                serialized_data = {}
-                for key, value in data.items():
-                    # Handle different types of values
-                    if isinstance(value, datetime):
-                        serialized_data[key] = value.isoformat()
-                    # Handle URL objects specifically
-                    elif str(type(value)).find('Url') != -1 or str(type(value)).find('URL') != -1:
-                        serialized_data[key] = str(value)
-                    elif hasattr(value, '__dict__'):  # Custom objects
-                        serialized_data[key] = str(value)
-                    # Handle lists of objects
-                    elif isinstance(value, list):
-                        serialized_list = []
-                        for item in value:
-                            if isinstance(item, datetime):
-                                serialized_list.append(item.isoformat())
-                            elif str(type(item)).find('Url') != -1 or str(type(item)).find('URL') != -1:
-                                serialized_list.append(str(item))
-                            elif hasattr(item, '__dict__'):
-                                serialized_list.append(str(item))
-                            else:
-                                serialized_list.append(item)
-                        serialized_data[key] = serialized_list
-                    else:
-                        serialized_data[key] = value
-                
-                # Print the serialized data for debugging
-                print(f"Serialized data: {serialized_data}")
-                
-                # Make the request
-                response = httpx.patch(url, json=serialized_data, headers=headers)
-                response.raise_for_status()
-                
-                print("Update operation successful using direct HTTP request")
-                return response.json()
-                
-            except Exception as update_e:
-                print(f"Update operation failed: {update_e}")
-                print(f"Error type: {type(update_e)}")
-                print(f"Error details: {repr(update_e)}")
-                
-                # Try one more approach - direct SQL update
-                try:
-                    print("Attempting direct update through Supabase client...")
-                    # Try to use the update method directly
-                    result = query.update(data).execute()
-                    print("Direct update successful")
-                    return result.data
-                except Exception as direct_e:
-                    print(f"Direct update also failed: {direct_e}")
-                    raise update_e
+            # Return the updated rows, when wanted, so callers need no follow-up read
+            response = await get_http_client().patch(
+                f"{SUPABASE_URL}/rest/v1/{table}",
+                params=build_filter_params(filters),
+                json=_serialize_row(data),
+                headers=_rest_headers(returning)
+            )
+            response.raise_for_status()
+            
+            logger.debug("Update operation successful")
+            return response.json() if return_representation else None
             
         elif query_type == "delete":
             if not filters:
                 raise ValueError("Filters are required for delete operations")
             
             try:
-                # Try the standard delete method
-                # We'll need to construct a query string for the filters
-                filter_params = []
-                for key, value in filters.items():
-                    if isinstance(value, dict):
-                        # Complex filters not supported in this basic implementation
-                        # Just use equality for now
-                        operator = list(value.keys())[0]
-                        if operator == "eq":
-                            filter_params.append(f"{key}=eq.{value[operator]}")
-                    else:
-                        filter_params.append(f"{key}=eq.{value}")
-                
-                # Construct the URL for the table with filters
-                import httpx
-                
-                # Get the Supabase URL and key from the client
-                supabase_url = SUPABASE_URL
-                supabase_key = SUPABASE_KEY
-                
-                # Construct the URL for the table with filters
-                url = f"{supabase_url}/rest/v1/{table}?{('&'.join(filter_params))}"
-                
-                # Set up the headers
-                headers = {
-                    "apikey": supabase_key,
-                    "Authorization": f"Bearer {supabase_key}",
-                    "Content-Type": "application/json",
-                    "Prefer": "return=representation"
-                }
-                
-                # Make the request
-                response = httpx.delete(url, headers=headers)
+                # Delete through PostgREST over the shared HTTP client
+                response = await get_http_client().delete(
+                    f"{SUPABASE_URL}/rest/v1/{table}",
+                    params=build_filter_params(filters),
+                    headers=_rest_headers(returning)
+                )
                 response.raise_for_status()
                 
-                print("Delete operation successful using direct HTTP request")
-                return response.json()
+                logger.debug("Delete operation successful using direct HTTP request")
+                return response.json() if return_representation else None
                 
             except Exception as delete_e:
-                print(f"Delete operation failed: {delete_e}")
-                print(f"Error type: {type(delete_e)}")
-                print(f"Error details: {repr(delete_e)}")
+                logger.warning("Delete operation failed: %r", delete_e)
                 
                 # Try one more approach - direct delete
                 try:
-                    print("Attempting direct delete through Supabase client...")
+                    logger.debug("Attempting direct delete through Supabase client...")
                     # Try to use the delete method directly
+                    query = supabase.table(table)
                     for key, value in filters.items():
                         if isinstance(value, dict):
                             # Skip complex filters for now
                             continue
                         query = query.eq(key, value)
                     
-                    result = query.delete().execute()
-                    print("Direct delete successful")
+                    result = await asyncio.to_thread(query.delete().execute)
+                    logger.debug("Direct delete successful")
                     return result.data
                 except Exception as direct_e:
-                    print(f"Direct delete also failed: {direct_e}")
+                    logger.warning("Direct delete also failed: %s", direct_e)
                     raise delete_e
             
         else:
@@ -391,15 +371,13 @@ async def execute_query(
             
     except Exception as e:
         # Log the error
-        print(f"Error executing query: {e}")
-        print(f"Error type: {type(e)}")
-        print(f"Error details: {repr(e)}")
-        print(f"Query type: {query_type}")
-        print(f"Table: {table}")
-        if filters:
-            print(f"Filters: {filters}")
-        if data:
-            print(f"Data: {data}")
+        logger.warning(
+            "Error executing %s on table %s: %r (filters=%s)",
+            query_type,
+            table,
+            e,
+            filters
+        )
         
         raise e
 
@@ -414,7 +392,7 @@ async def sign_up(email: str, password: str) -> dict:
         })
         return response
     except Exception as e:
-        print(f"Supabase sign-up error: {str(e)}")
+        logger.warning("Supabase sign-up error: %s", e)
         raise
 
 async def sign_in(email: str, password: str):
@@ -429,24 +407,20 @@ async def sign_in(email: str, password: str):
         The user's session
     """
     try:
-        print(f"Signing in user with email: {email}")
+        logger.debug("Signing in user with email: %s", email)
         
-        # Sign in with password
-        response = supabase.auth.sign_in_with_password({
+        # Sign in with password. The client is synchronous, so the request
+        # runs in a worker thread instead of blocking the event loop.
+        response = await asyncio.to_thread(supabase.auth.sign_in_with_password, {
             "email": email,
             "password": password
         })
         
-        print(f"Sign-in response type: {type(response)}")
-        print(f"Sign-in response attributes: {dir(response)}")
-        
         return response
         
     except Exception as e:
         # Log the error
-        print(f"Error signing in user: {str(e)}")
-        print(f"Error type: {type(e)}")
-        print(f"Error details: {repr(e)}")
+        logger.warning("Error signing in user: %s", e)
         raise e
 
 async def sign_out(jwt: str):
@@ -464,7 +438,7 @@ async def sign_out(jwt: str):
         
     except Exception as e:
         # Log the error
-        print(f"Error signing out user: {e}")
+        logger.warning("Error signing out user: %s", e)
         raise e
 
 async def get_user(jwt: str):
@@ -488,65 +462,82 @@ async def get_user(jwt: str):
         
     except Exception as e:
         # Log the error
-        print(f"Error getting user: {e}")
+        logger.warning("Error getting user: %s", e)
         raise e
 
 def get_supabase_client() -> Client:
-    """Get Supabase client instance."""
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+    """Get the shared Supabase client instance, created once at import."""
+    return supabase
 
-async def execute_raw_sql(query: str):
+def _numbered_placeholders(query: str) -> str:
+    """Turn psycopg-style %s placeholders into asyncpg's $1, $2, ..."""
+    counter = itertools.count(1)
+    return re.sub(r"%s", lambda _: f"${next(counter)}", query)
+
+async def execute_raw_sql(query: str, params: Optional[List[Any]] = None):
     """
-    Execute a raw SQL query using the Supabase REST API.
+    Execute a raw SQL query.
+    
+    With params, the query is sent as a prepared statement on the direct
+    Postgres pool, so values are never interpolated and the plan is reused.
+    This needs DATABASE_URL: the execute_sql RPC only takes query text.
     
     Args:
-        query: The SQL query to execute
+        query: The SQL query to execute, with %s placeholders for params
+        params: Values for the placeholders, in order
         
     Returns:
-        The result of the query
+        The result of the query, as {"data": rows}
     """
     try:
-        print(f"Executing raw SQL query: {query}")
+        logger.debug("Executing raw SQL query: %s", query)
+        
+        if params is not None:
+            if await get_db_pool() is None:
+                raise ValueError("Parameterized raw SQL queries need DATABASE_URL to be set")
+            return {"data": await db_fetch(_numbered_placeholders(query), *params)}
         
-        # Use the Supabase client to execute the raw SQL query
-        result = supabase.rpc("execute_sql", {"query": query}).execute()
+        # Call the execute_sql function over the shared HTTP client
+        response = await get_http_client().post(
+            f"{SUPABASE_URL}/rest/v1/rpc/execute_sql",
+            json={"query": query},
+            headers=_rest_headers()
+        )
+        response.raise_for_status()
         
-        print(f"Raw SQL query result: {result}")
+        result = {"data": response.json()}
+        logger.debug("Raw SQL query result: %s", result)
         return result
         
     except Exception as e:
-        print(f"Error executing raw SQL query: {str(e)}")
-        print(f"Error type: {type(e)}")
-        print(f"Error details: {repr(e)}")
+        logger.warning("Error executing raw SQL query: %s", e)
+        raise e
+
+async def execute_rpc(function: str, args: Optional[Dict[str, Any]] = None):
+    """
+    Call a Postgres function through the PostgREST RPC endpoint.
+    
+    Args:
+        function: The name of the function to call
+        args: The named arguments of the function
         
-        # Try using the REST API directly
-        try:
-            import httpx
-            
-            # Get the Supabase URL and key
-            supabase_url = SUPABASE_URL
-            supabase_key = SUPABASE_KEY
-            
-            # Construct the URL for the RPC endpoint
-            url = f"{supabase_url}/rest/v1/rpc/execute_sql"
-            
-            # Set up the headers
-            headers = {
-                "apikey": supabase_key,
-                "Authorization": f"Bearer {supabase_key}",
-                "Content-Type": "application/json"
-            }
-            
-            # Make the request
-            response = httpx.post(url, json={"query": query}, headers=headers)
-            response.raise_for_status()
-            
-            print(f"Raw SQL query result via REST API: {response.json()}")
-            return {"data": response.json()}
-            
-        except Exception as http_e:
-            print(f"REST API approach also failed: {str(http_e)}")
-            raise e
+    Returns:
+        The rows returned by the function
+    """
+    try:
+        logger.debug("Calling RPC function: %s", function)
+        
+        response = await get_http_client().post(
+            f"{SUPABASE_URL}/rest/v1/rpc/{function}",
+            json={key: serialize_datetime(value) for key, value in (args or {}).items()},
+            headers=_rest_headers()
+        )
+        response.raise_for_status()
+        return response.json()
+        
+    except Exception as e:
+        logger.warning("Error calling RPC function %s: %s", function, e)
+        raise e
 
 async def check_user_exists(user_id: str) -> bool:
     """
@@ -559,26 +550,24 @@ async def check_user_exists(user_id: str) -> bool:
         True if the user exists, False otherwise
     """
     try:
-        print(f"Checking if user exists in Supabase auth: {user_id}")
+        logger.debug("Checking if user exists in Supabase auth: %s", user_id)
         
         # Try to get the user from Supabase auth
         response = supabase.auth.admin.get_user_by_id(user_id)
         
         # If we get here, the user exists
-        print(f"User exists in Supabase auth: {user_id}")
+        logger.debug("User exists in Supabase auth: %s", user_id)
         return True
         
     except Exception as e:
-        print(f"Error checking if user exists in Supabase auth: {str(e)}")
-        print(f"Error type: {type(e)}")
-        print(f"Error details: {repr(e)}")
+        logger.warning("Error checking if user exists in Supabase auth: %s", e)
         
         # Check if the error is related to user not found
         error_str = str(e).lower()
         if "user not found" in error_str or "not found" in error_str:
-            print(f"User not found in Supabase auth: {user_id}")
+            logger.debug("User not found in Supabase auth: %s", user_id)
             return False
             
         # For other errors, we're not sure if the user exists or not
-        print(f"Unknown error checking if user exists in Supabase auth: {str(e)}")
+        logger.warning("Unknown error checking if user exists in Supabase auth: %s", e)
         return False 
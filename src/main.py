@@ -9,11 +9,15 @@ import os
 from dotenv import load_dotenv
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 import asyncio
 from .core.scheduler import run_scheduled_tasks
 from .core.datastax import initialize_datastax
+from .core.cache import close_cache
+from .core.http import close_http_client
+from .core.smtp import close_smtp_client
+from .core.database import close_db_pool
 
 # Load environment variables
 load_dotenv()
@@ -65,6 +69,13 @@ async def lifespan(app: FastAPI):
             await task
         except asyncio.CancelledError:
             print("Scheduler task cancelled")
+    
+    # Close the Redis cache connection, the database pool and the shared HTTP
+    # and SMTP clients
+    await close_cache()
+    await close_db_pool()
+    await close_http_client()
+    await close_smtp_client()
 
 print("Creating FastAPI application...")
 
@@ -97,6 +108,7 @@ app = FastAPI(
     version="1.0.0",
     debug=DEBUG,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     swagger_ui_parameters={
         "persistAuthorization": True,
         "displayRequestDuration": True,
@@ -134,6 +146,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include API router
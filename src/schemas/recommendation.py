@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from uuid import UUID
@@ -17,6 +17,8 @@ class FoodPreference(BaseModel):
 
 class RecommendationRequest(BaseModel):
     """Request for food recommendations"""
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     search_term: str
     user_id: Optional[UUID] = None
     limit: int = 10
@@ -44,6 +46,8 @@ class RecommendationResponse(BaseModel):
 
 class AIRecommendationRequest(BaseModel):
     """Request for AI-powered food recommendations"""
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     query: str
     include_user_preferences: bool = True
     limit: int = 5
@@ -78,12 +82,14 @@ class AIRecommendationResponse(BaseModel):
 
 class DrFoodloveRequest(BaseModel):
     """Request for Dr. Foodlove food recommendations"""
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     query: str
     include_user_preferences: bool = True
     limit: int = 5
     detailed_response: bool = False
     custom_preferences: Optional[Dict[str, Any]] = None
-    item_id: Optional[str] = None
+    item_id: Optional[UUID] = None
 
 
 class DrFoodloveNutritionInfo(BaseModel):
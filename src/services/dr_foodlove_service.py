@@ -541,10 +541,10 @@ async def get_dr_foodlove_recommendations(
         Dictionary containing AI recommendations and metadata
     """
     # Log the input parameters for debugging
-    logger.info(f"Dr.Foodlove API called with query: '{query}'")
-    logger.info(f"User preferences provided: {user_preferences is not None}")
-    logger.info(f"Available foods provided: {available_foods is not None}")
-    logger.info(f"Limit: {limit}, Detailed response: {detailed_response}")
+    logger.info("Dr.Foodlove API called with query: '%s'", query)
+    logger.info("User preferences provided: %s", user_preferences is not None)
+    logger.info("Available foods provided: %s", available_foods is not None)
+    logger.info("Limit: %s, Detailed response: %s", limit, detailed_response)
     
     # Generate mock LLM response
     recommendations, conversation = generate_mock_llm_response(
@@ -573,7 +573,7 @@ async def get_dr_foodlove_recommendations(
             user_preferences
         )
     
-    logger.info(f"Successfully processed {len(recommendations)} mock LLM recommendations")
+    logger.info("Successfully processed %s mock LLM recommendations", len(recommendations))
     return response
 
 def generate_health_insights(
@@ -4,13 +4,14 @@ from fastapi import UploadFile, HTTPException, status
 from typing import List
 import uuid
 from pathlib import Path
-import aiofiles
-from ..core.supabase import supabase
+from ..core.supabase import supabase, SUPABASE_URL, SUPABASE_KEY
+from ..core.http import get_http_client
 
 # Define upload directory
 UPLOAD_DIR = Path("uploads")
 ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "gif"}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+UPLOAD_CHUNK_SIZE = 256 * 1024  # 256KB
 
 async def save_upload_file(upload_file: UploadFile, folder: str) -> str:
     """
@@ -51,10 +52,19 @@ async def save_upload_file(upload_file: UploadFile, folder: str) -> str:
     # Return the relative path
     return str(Path(folder) / unique_filename)
 
+async def _iter_upload(file: UploadFile):
+    """Yield the uploaded file in fixed-size chunks."""
+    await file.seek(0)
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        yield chunk
+
 async def upload_to_supabase(file: UploadFile, bucket: str, path: str) -> str:
     """
     Upload a file to Supabase Storage.
     
+    The file is streamed to Storage in chunks straight from the request's
+    spooled upload, so it is never held in memory as a whole.
+    
     Args:
         file: The file to upload
         bucket: The storage bucket name
@@ -63,10 +73,10 @@ async def upload_to_supabase(file: UploadFile, bucket: str, path: str) -> str:
     Returns:
         The public URL of the uploaded file
     """
-    # Validate file size
-    file_size = 0
-    contents = await file.read(MAX_FILE_SIZE + 1)
-    file_size = len(contents)
+    # Validate file size without reading the file
+    file_size = file.size
+    if file_size is None:
+        file_size = file.file.seek(0, os.SEEK_END)
     
     if file_size > MAX_FILE_SIZE:
         raise HTTPException(
@@ -82,15 +92,19 @@ async def upload_to_supabase(file: UploadFile, bucket: str, path: str) -> str:
             detail=f"File extension '{file_ext}' not allowed. Allowed extensions: {', '.join(ALLOWED_EXTENSIONS)}"
         )
     
-    # Create a temporary file
-    temp_file = Path(f"/tmp/{uuid.uuid4()}.{file_ext}")
-    async with aiofiles.open(temp_file, "wb") as f:
-        await f.write(contents)
-    
     try:
-        # Upload to Supabase Storage
-        with open(temp_file, "rb") as f:
-            response = supabase.storage.from_(bucket).upload(path, f, {"content-type": f"image/{file_ext}"})
+        # Upload to Supabase Storage over the shared HTTP client
+        response = await get_http_client().post(
+            f"{SUPABASE_URL}/storage/v1/object/{bucket}/{path}",
+            content=_iter_upload(file),
+            headers={
+                "apikey": SUPABASE_KEY,
+                "Authorization": f"Bearer {SUPABASE_KEY}",
+                "Content-Type": f"image/{file_ext}",
+                "Content-Length": str(file_size)
+            }
+        )
+        response.raise_for_status()
         
         # Get the public URL
         file_url = supabase.storage.from_(bucket).get_public_url(path)
@@ -101,10 +115,6 @@ async def upload_to_supabase(file: UploadFile, bucket: str, path: str) -> str:
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload file to Supabase Storage: {str(e)}"
         )
-    finally:
-        # Clean up the temporary file
-        if temp_file.exists():
-            os.remove(temp_file)
 
 async def delete_file(file_path: str) -> bool:
     """
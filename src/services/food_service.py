@@ -0,0 +1,85 @@
+import logging
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from ..core.supabase import execute_query
+from ..core.cache import cache_get, cache_set, cache_delete
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Number of foods sent to the AI services as context
+AVAILABLE_FOODS_LIMIT = 50
+AVAILABLE_FOODS_CACHE_KEY = f"foods:available:v1:limit={AVAILABLE_FOODS_LIMIT}"
+AVAILABLE_FOODS_CACHE_TTL = 30
+
+# The in-process copy is only cleared by writes in this worker, so it is kept
+# for a few seconds; changes made through other workers show up after that
+AVAILABLE_FOODS_LOCAL_TTL = 5
+
+# Columns of the AI context, with title renamed to the "name" key the
+# prompts use, and the columns of a food as exposed to clients (matches
+# FoodResponse)
+FOOD_CONTEXT_COLUMNS = "id,name:title,description,category,dietary_requirements,allergens"
+FOOD_DETAIL_COLUMNS = (
+    "id,user_id,title,description,category,food_type,dietary_requirements,allergens,"
+    "expiry_date,location,is_homemade,is_available,pickup_times,tickets_required,"
+    "image_url,created_at,updated_at"
+)
+
+# In-process copy of the projected list, as (expires_at, foods)
+_available_foods_local: Optional[Tuple[float, Tuple[Dict[str, Any], ...]]] = None
+
+
+async def get_available_foods_context() -> Sequence[Dict[str, Any]]:
+    """
+    Get a sample of available foods shaped for the AI recommendation prompts.
+
+    PostgREST selects and renames the columns, so rows need no reshaping. The
+    list is kept in Redis and as an immutable tuple in this process, so the
+    hot path is a plain lookup. Callers must treat the result as read-only.
+    Errors are logged and an empty tuple is returned, since the AI services
+    can still answer without this context.
+    """
+    global _available_foods_local
+
+    now = time.monotonic()
+    if _available_foods_local is not None and _available_foods_local[0] > now:
+        return _available_foods_local[1]
+
+    cached = await cache_get(AVAILABLE_FOODS_CACHE_KEY)
+    if cached is not None:
+        _available_foods_local = (now + AVAILABLE_FOODS_LOCAL_TTL, tuple(cached))
+        return _available_foods_local[1]
+
+    try:
+        foods_result = await execute_query(
+            table="foods",
+            query_type="select",
+            filters={"is_available": True},
+            select=FOOD_CONTEXT_COLUMNS,
+            limit=AVAILABLE_FOODS_LIMIT  # Limit to avoid token limits
+        )
+    except Exception:
+        logger.exception("Error fetching available foods")
+        return ()
+
+    if not foods_result:
+        logger.warning("No available foods found in the database")
+        return ()
+
+    # PostgREST already returns the rows in the prompt shape
+    available_foods = tuple(foods_result)
+
+    logger.info("Fetched %d available foods for AI context", len(available_foods))
+    await cache_set(AVAILABLE_FOODS_CACHE_KEY, available_foods, AVAILABLE_FOODS_CACHE_TTL)
+    _available_foods_local = (now + AVAILABLE_FOODS_LOCAL_TTL, available_foods)
+    return available_foods
+
+
+async def invalidate_available_foods_context() -> None:
+    """Drop the cached available foods list after a food listing changes"""
+    global _available_foods_local
+
+    _available_foods_local = None
+    await cache_delete(AVAILABLE_FOODS_CACHE_KEY)
@@ -1,11 +1,14 @@
 import os
 import json
+import orjson
 import logging
-import requests
+import httpx
 import time
 from typing import Dict, List, Optional, Any, Union
 from uuid import UUID
 
+from ..core.http import get_http_client
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,23 +29,23 @@ FLOW_ID = os.getenv("DATASTAX_FLOW_ID", "567ad106-a9f3-4e30-b909-628e89186549")
 # Fix token by removing any line breaks or whitespace
 raw_token = os.getenv("DATASTAX_APPLICATION_TOKEN", "")
 APPLICATION_TOKEN = "".join(raw_token.split()) if raw_token else ""
-logger.info(f"Fixed APPLICATION_TOKEN. Original length: {len(raw_token)}, New length: {len(APPLICATION_TOKEN)}")
+logger.info("Fixed APPLICATION_TOKEN. Original length: %s, New length: %s", len(raw_token), len(APPLICATION_TOKEN))
 
 ENDPOINT = os.getenv("DATASTAX_ENDPOINT", "")  # You can set a specific endpoint name in the flow settings
 
 # Fix refresh token by removing any line breaks or whitespace
 raw_refresh_token = os.getenv("DATASTAX_REFRESH_TOKEN", "")
 REFRESH_TOKEN = "".join(raw_refresh_token.split()) if raw_refresh_token else ""
-logger.info(f"Fixed REFRESH_TOKEN. Original length: {len(raw_refresh_token)}, New length: {len(REFRESH_TOKEN)}")
+logger.info("Fixed REFRESH_TOKEN. Original length: %s, New length: %s", len(raw_refresh_token), len(REFRESH_TOKEN))
 
 TOKEN_EXPIRY = 0  # Track token expiry time
 
 # Debug token loading
-logger.info(f"DataStax token configuration:")
-logger.info(f"  Application token available: {'Yes' if APPLICATION_TOKEN else 'No'}")
-logger.info(f"  Application token length: {len(APPLICATION_TOKEN) if APPLICATION_TOKEN else 0}")
-logger.info(f"  Refresh token available: {'Yes' if REFRESH_TOKEN else 'No'}")
-logger.info(f"  Refresh token length: {len(REFRESH_TOKEN) if REFRESH_TOKEN else 0}")
+logger.info("DataStax token configuration:")
+logger.info("  Application token available: %s", 'Yes' if APPLICATION_TOKEN else 'No')
+logger.info("  Application token length: %s", len(APPLICATION_TOKEN) if APPLICATION_TOKEN else 0)
+logger.info("  Refresh token available: %s", 'Yes' if REFRESH_TOKEN else 'No')
+logger.info("  Refresh token length: %s", len(REFRESH_TOKEN) if REFRESH_TOKEN else 0)
 
 # Check if refresh token is the same as application token (common mistake)
 if REFRESH_TOKEN == APPLICATION_TOKEN:
@@ -83,7 +86,7 @@ async def refresh_auth_token() -> str:
     # Try to reload refresh token if not available
     if not REFRESH_TOKEN:
         REFRESH_TOKEN = os.getenv("DATASTAX_REFRESH_TOKEN", "")
-        logger.info(f"Reloaded REFRESH_TOKEN from environment. Length: {len(REFRESH_TOKEN) if REFRESH_TOKEN else 0}")
+        logger.info("Reloaded REFRESH_TOKEN from environment. Length: %s", len(REFRESH_TOKEN) if REFRESH_TOKEN else 0)
     
     # Check if we have a refresh token
     if not REFRESH_TOKEN:
@@ -106,15 +109,15 @@ async def refresh_auth_token() -> str:
         }
         
         try:
-            validation_response = requests.get(validation_url, headers=headers, timeout=10)
+            validation_response = await get_http_client().get(validation_url, headers=headers, timeout=10)
             
             # If the token is valid, just use it
             if validation_response.status_code == 200:
                 logger.info("Current token is still valid. No need to refresh.")
                 TOKEN_EXPIRY = time.time() + 3600  # Set expiry to 1 hour from now
                 return APPLICATION_TOKEN
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Token validation request failed: {e}")
+        except httpx.HTTPError as e:
+            logger.warning("Token validation request failed: %s", e)
         
         # Current token is invalid. Attempting to use refresh token...
         logger.info("Current token is invalid. Attempting to use refresh token...")
@@ -144,18 +147,18 @@ async def refresh_auth_token() -> str:
         # Try each approach
         for i, approach in enumerate(refresh_approaches):
             try:
-                logger.info(f"Trying token refresh approach {i+1}...")
+                logger.info("Trying token refresh approach %s...", i+1)
                 
                 # Use POST for refresh, GET for validation
                 if "refresh" in approach["url"]:
-                    response = requests.post(
+                    response = await get_http_client().post(
                         approach["url"], 
                         headers=approach["headers"], 
                         json=approach["payload"],
                         timeout=10
                     )
                 else:
-                    response = requests.get(
+                    response = await get_http_client().get(
                         approach["url"], 
                         headers=approach["headers"],
                         timeout=10
@@ -163,7 +166,7 @@ async def refresh_auth_token() -> str:
                 
                 # Check for CloudFront errors (which return HTML)
                 if response.status_code == 403 and "<!DOCTYPE HTML" in response.text:
-                    logger.warning(f"Approach {i+1} failed with CloudFront 403 error. This may indicate IP restrictions or rate limiting.")
+                    logger.warning("Approach %s failed with CloudFront 403 error. This may indicate IP restrictions or rate limiting.", i+1)
                     continue
                 
                 if response.status_code == 200:
@@ -177,7 +180,7 @@ async def refresh_auth_token() -> str:
                     # For refresh approaches, extract the new token
                     try:
                         token_data = response.json()
-                        logger.info(f"Token refresh response keys: {token_data.keys()}")
+                        logger.info("Token refresh response keys: %s", token_data.keys())
                         
                         # Different APIs might use different field names
                         new_token = token_data.get("access_token") or token_data.get("token") or token_data.get("accessToken")
@@ -186,23 +189,23 @@ async def refresh_auth_token() -> str:
                         if new_token:
                             APPLICATION_TOKEN = new_token
                             TOKEN_EXPIRY = time.time() + expires_in - 300  # Set expiry with 5-minute buffer
-                            logger.info(f"Successfully refreshed authentication token. Valid for {expires_in} seconds.")
+                            logger.info("Successfully refreshed authentication token. Valid for %s seconds.", expires_in)
                             return new_token
                         else:
                             logger.warning("Token refresh response did not contain a new token.")
                     except Exception as e:
-                        logger.warning(f"Error parsing token refresh response: {e}")
+                        logger.warning("Error parsing token refresh response: %s", e)
                 else:
-                    logger.warning(f"Approach {i+1} failed with status code: {response.status_code}")
+                    logger.warning("Approach %s failed with status code: %s", i+1, response.status_code)
                     # Log response content for debugging, but avoid logging large HTML responses
                     if response.headers.get('content-type') and 'application/json' in response.headers.get('content-type'):
                         try:
                             error_data = response.json()
-                            logger.warning(f"Response: {json.dumps(error_data)[:100]}...")
+                            logger.warning("Response: %s...", json.dumps(error_data)[:100])
                         except:
-                            logger.warning(f"Response: {response.text[:100]}...")
+                            logger.warning("Response: %s...", response.text[:100])
             except Exception as e:
-                logger.warning(f"Error with refresh approach {i+1}: {e}")
+                logger.warning("Error with refresh approach %s: %s", i+1, e)
         
         # If we get here, all approaches failed
         logger.error("All token refresh approaches failed.")
@@ -219,10 +222,10 @@ async def refresh_auth_token() -> str:
                 TOKEN_EXPIRY = time.time() + 1800  # Set a shorter expiry (30 min) for this fallback
                 return APPLICATION_TOKEN
         except Exception as e:
-            logger.error(f"Error reloading token from environment: {e}")
+            logger.error("Error reloading token from environment: %s", e)
     
     except Exception as e:
-        logger.error(f"Error refreshing authentication token: {e}")
+        logger.error("Error refreshing authentication token: %s", e)
     
     # If all refresh attempts failed, return the original token
     logger.warning("Token refresh failed. Using the existing application token.")
@@ -241,16 +244,16 @@ async def get_valid_token() -> str:
     global TOKEN_EXPIRY, APPLICATION_TOKEN
     
     # Debug token state
-    logger.info(f"get_valid_token called. Current token state:")
-    logger.info(f"  APPLICATION_TOKEN length: {len(APPLICATION_TOKEN) if APPLICATION_TOKEN else 0}")
-    logger.info(f"  TOKEN_EXPIRY: {TOKEN_EXPIRY}")
-    logger.info(f"  Current time: {time.time()}")
+    logger.info("get_valid_token called. Current token state:")
+    logger.info("  APPLICATION_TOKEN length: %s", len(APPLICATION_TOKEN) if APPLICATION_TOKEN else 0)
+    logger.info("  TOKEN_EXPIRY: %s", TOKEN_EXPIRY)
+    logger.info("  Current time: %s", time.time())
     
     # If no token is available, try to reload from environment
     if not APPLICATION_TOKEN:
         APPLICATION_TOKEN = os.getenv("DATASTAX_APPLICATION_TOKEN", "")
         APPLICATION_TOKEN = "".join(APPLICATION_TOKEN.split()) if APPLICATION_TOKEN else ""
-        logger.info(f"Reloaded APPLICATION_TOKEN from environment. Length: {len(APPLICATION_TOKEN) if APPLICATION_TOKEN else 0}")
+        logger.info("Reloaded APPLICATION_TOKEN from environment. Length: %s", len(APPLICATION_TOKEN) if APPLICATION_TOKEN else 0)
     
     if not REFRESH_TOKEN and not APPLICATION_TOKEN:
         logger.warning("No application token or refresh token available after reload attempt.")
@@ -259,7 +262,7 @@ async def get_valid_token() -> str:
     # Check if token is expired or about to expire
     current_time = time.time()
     if current_time > TOKEN_EXPIRY:
-        logger.info(f"Token expired or about to expire. Current time: {current_time}, Expiry: {TOKEN_EXPIRY}")
+        logger.info("Token expired or about to expire. Current time: %s, Expiry: %s", current_time, TOKEN_EXPIRY)
         
         # Try to validate the current token before refreshing
         validation_url = f"{BASE_API_URL}/lf/{LANGFLOW_ID}/api/v1/validate"
@@ -270,7 +273,7 @@ async def get_valid_token() -> str:
         
         try:
             # Try a quick validation request
-            validation_response = requests.get(validation_url, headers=headers, timeout=5)
+            validation_response = await get_http_client().get(validation_url, headers=headers, timeout=5)
             
             # If the token is still valid, update the expiry and return it
             if validation_response.status_code == 200:
@@ -278,7 +281,7 @@ async def get_valid_token() -> str:
                 TOKEN_EXPIRY = current_time + 3600  # Set expiry to 1 hour from now
                 return APPLICATION_TOKEN
         except Exception as e:
-            logger.warning(f"Token validation check failed: {e}")
+            logger.warning("Token validation check failed: %s", e)
         
         # If validation failed or we couldn't check, try to refresh
         refreshed_token = await refresh_auth_token()
@@ -292,7 +295,7 @@ async def get_valid_token() -> str:
             
         return refreshed_token
     
-    logger.info(f"Using existing valid token. Expires in {TOKEN_EXPIRY - current_time} seconds.")
+    logger.info("Using existing valid token. Expires in %s seconds.", TOKEN_EXPIRY - current_time)
     return APPLICATION_TOKEN
 
 
@@ -329,11 +332,11 @@ async def run_langflow(
     valid_output_types = ["text", "chat", "any", "debug"]
     
     if input_type not in valid_input_types:
-        logger.warning(f"Invalid input_type: {input_type}. Must be one of {valid_input_types}. Using 'text' instead.")
+        logger.warning("Invalid input_type: %s. Must be one of %s. Using 'text' instead.", input_type, valid_input_types)
         input_type = "text"
     
     if output_type not in valid_output_types:
-        logger.warning(f"Invalid output_type: {output_type}. Must be one of {valid_output_types}. Using 'text' instead.")
+        logger.warning("Invalid output_type: %s. Must be one of %s. Using 'text' instead.", output_type, valid_output_types)
         output_type = "text"
     
     # Get a valid token if not provided
@@ -355,15 +358,15 @@ async def run_langflow(
     api_url = f"{BASE_API_URL}/lf/{LANGFLOW_ID}/api/v1/run/{endpoint}"
     
     # Debug configuration
-    logger.info(f"DataStax Langflow Configuration:")
-    logger.info(f"  API URL: {BASE_API_URL}")
-    logger.info(f"  Langflow ID: {LANGFLOW_ID}")
-    logger.info(f"  Endpoint/Flow ID: {endpoint}")
-    logger.info(f"  Full API URL: {api_url}")
-    logger.info(f"  Token provided: {'Yes' if application_token else 'No'}")
-    logger.info(f"  Token length: {len(application_token) if application_token else 0}")
-    logger.info(f"  Input type: {input_type}")
-    logger.info(f"  Output type: {output_type}")
+    logger.info("DataStax Langflow Configuration:")
+    logger.info("  API URL: %s", BASE_API_URL)
+    logger.info("  Langflow ID: %s", LANGFLOW_ID)
+    logger.info("  Endpoint/Flow ID: %s", endpoint)
+    logger.info("  Full API URL: %s", api_url)
+    logger.info("  Token provided: %s", 'Yes' if application_token else 'No')
+    logger.info("  Token length: %s", len(application_token) if application_token else 0)
+    logger.info("  Input type: %s", input_type)
+    logger.info("  Output type: %s", output_type)
 
     # Prepare payload
     payload = {
@@ -386,8 +389,8 @@ async def run_langflow(
     
     try:
         # Make the API request
-        logger.info(f"Calling DataStax Langflow API at {api_url}")
-        response = requests.post(api_url, json=payload, headers=headers, timeout=30)
+        logger.info("Calling DataStax Langflow API at %s", api_url)
+        response = await get_http_client().post(api_url, json=payload, headers=headers, timeout=30)
         
         # Check for authentication errors
         if response.status_code == 401 and retry_on_auth_error:
@@ -418,7 +421,7 @@ async def run_langflow(
         if response.status_code == 422:
             try:
                 error_data = response.json()
-                logger.error(f"Error response data: {error_data}")
+                logger.error("Error response data: %s", error_data)
                 
                 # Check if the error is related to input_type or output_type
                 if "input_type" in str(error_data) or "output_type" in str(error_data):
@@ -435,7 +438,7 @@ async def run_langflow(
                         retry_on_auth_error=retry_on_auth_error
                     )
             except Exception as e:
-                logger.error(f"Error parsing validation error response: {e}")
+                logger.error("Error parsing validation error response: %s", e)
         
         # Process the response
         try:
@@ -457,14 +460,14 @@ async def run_langflow(
                     "status_code": response.status_code
                 }
         except Exception as e:
-            logger.error(f"Error processing API response: {e}")
+            logger.error("Error processing API response: %s", e)
             return {
                 "error": True,
                 "message": f"Error processing API response: {str(e)}",
                 "status_code": response.status_code if 'response' in locals() else 500
             }
     except Exception as e:
-        logger.error(f"Error calling DataStax Langflow API: {e}")
+        logger.error("Error calling DataStax Langflow API: %s", e)
         return {
             "error": True,
             "message": f"Error calling DataStax Langflow API: {str(e)}",
@@ -495,9 +498,9 @@ async def get_ai_food_recommendations(
         Dictionary containing AI recommendations and metadata
     """
     # Log the function call
-    logger.info(f"get_ai_food_recommendations called with query: '{query[:100]}...'")
-    logger.info(f"User preferences provided: {user_preferences is not None}")
-    logger.info(f"Available foods provided: {available_foods is not None}")
+    logger.info("get_ai_food_recommendations called with query: '%s...'", query[:100])
+    logger.info("User preferences provided: %s", user_preferences is not None)
+    logger.info("Available foods provided: %s", available_foods is not None)
     
     # Get a valid token if not provided
     if application_token is None:
@@ -530,7 +533,7 @@ async def get_ai_food_recommendations(
         message["available_foods"] = available_foods[:50]  # Limit to 50 foods to avoid token limits
     
     # Convert message to JSON string
-    message_str = json.dumps(message)
+    message_str = orjson.dumps(message).decode()
     
     try:
         # Call the DataStax Langflow API
@@ -543,7 +546,7 @@ async def get_ai_food_recommendations(
         
         # Check for errors
         if response.get("error"):
-            logger.error(f"Error from DataStax Langflow API: {response.get('message')}")
+            logger.error("Error from DataStax Langflow API: %s", response.get('message'))
             return {
                 "success": False,
                 "query": query,
@@ -565,8 +568,8 @@ async def get_ai_food_recommendations(
                 "available_foods_used": available_foods is not None
             }
         except Exception as e:
-            logger.error(f"Error processing AI recommendations: {e}")
-            logger.info(f"Raw response from langflow service: {json.dumps(response)[:500]}...")
+            logger.error("Error processing AI recommendations: %s", e)
+            logger.info("Raw response from langflow service: %s...", json.dumps(response)[:500])
             return {
                 "success": False,
                 "query": query,
@@ -575,7 +578,7 @@ async def get_ai_food_recommendations(
                 "error": f"Error processing AI recommendations: {str(e)}"
             }
     except Exception as e:
-        logger.error(f"Error calling DataStax Langflow API: {e}")
+        logger.error("Error calling DataStax Langflow API: %s", e)
         return {
             "success": False,
             "query": query,
@@ -599,9 +602,9 @@ def process_ai_recommendations(response: Dict[str, Any], limit: int = 5) -> List
     recommendations = []
     
     # Log the response structure for debugging
-    logger.info(f"Processing response structure: {type(response)}")
+    logger.info("Processing response structure: %s", type(response))
     if isinstance(response, dict):
-        logger.info(f"Response keys: {list(response.keys())}")
+        logger.info("Response keys: %s", list(response.keys()))
     
     try:
         # Extract recommendations from the response
@@ -673,7 +676,7 @@ def process_ai_recommendations(response: Dict[str, Any], limit: int = 5) -> List
                                                                     "confidence_score": None
                                                                 })
                                                     except Exception as e:
-                                                        logger.warning(f"Error parsing text as recommendations: {e}")
+                                                        logger.warning("Error parsing text as recommendations: %s", e)
                                                         # Fallback: treat the entire text as a single recommendation
                                                         recommendations = [{
                                                             "name": "AI Food Recommendation",
@@ -722,7 +725,7 @@ def process_ai_recommendations(response: Dict[str, Any], limit: int = 5) -> List
                     # If result is already a list, use it directly
                     recommendations = result
     except Exception as e:
-        logger.error(f"Error processing AI response: {e}")
+        logger.error("Error processing AI response: %s", e)
         # Return empty list on error
         return []
     
@@ -755,6 +758,6 @@ def process_ai_recommendations(response: Dict[str, Any], limit: int = 5) -> List
             })
     
     # Log the extracted recommendations
-    logger.info(f"Extracted {len(structured_recommendations)} recommendations")
+    logger.info("Extracted %s recommendations", len(structured_recommendations))
     
     return structured_recommendations 
\ No newline at end of file
@@ -0,0 +1,25 @@
+import logging
+from typing import Optional
+
+from ..core.cache import cache_get_bytes, cache_incr
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Nearby swap responses are cached briefly per user and query. Every key
+# embeds a generation number, so bumping the generation drops all of them
+# at once when foods or locations change.
+NEARBY_SWAPS_CACHE_TTL = 60
+NEARBY_SWAPS_GENERATION_KEY = "swaps:nearby:generation"
+
+
+async def nearby_swaps_cache_key(user_id: str, radius: float, limit: int, after: Optional[str] = None) -> str:
+    """Cache key for a page of a user's nearby swaps under the current generation"""
+    raw = await cache_get_bytes(NEARBY_SWAPS_GENERATION_KEY)
+    generation = int(raw) if raw else 0
+    return f"swaps:nearby:v2:{generation}:{user_id}:radius={radius}:limit={limit}:after={after or ''}"
+
+
+async def invalidate_nearby_swaps() -> None:
+    """Drop every cached nearby swaps response after a food or location changes"""
+    await cache_incr(NEARBY_SWAPS_GENERATION_KEY)
@@ -0,0 +1,56 @@
+-- Find potential swaps near a user in a single query
+CREATE EXTENSION IF NOT EXISTS postgis;
+
+-- The API stores the user's location as {"latitude", "longitude", "formatted_address"}
+ALTER TABLE users
+ADD COLUMN IF NOT EXISTS location JSONB;
+
+-- Pair each of the user's available foods with the available foods of
+-- users within p_radius_m meters, newest listings first
+CREATE OR REPLACE FUNCTION get_nearby_swap_candidates(
+  p_user_id UUID,
+  p_radius_m FLOAT,
+  p_limit INTEGER DEFAULT 100
+)
+RETURNS TABLE (requester_food JSONB, provider_food JSONB) AS $$
+  WITH me AS (
+    SELECT ST_SetSRID(ST_MakePoint(
+      (location->>'longitude')::float,
+      (location->>'latitude')::float
+    ), 4326)::geography AS point
+    FROM users
+    WHERE id = p_user_id
+    AND location IS NOT NULL
+  ),
+  nearby AS (
+    SELECT u.id
+    FROM users u, me
+    WHERE u.id <> p_user_id
+    AND u.location IS NOT NULL
+    AND ST_DWithin(
+      ST_SetSRID(ST_MakePoint(
+        (u.location->>'longitude')::float,
+        (u.location->>'latitude')::float
+      ), 4326)::geography,
+      me.point,
+      p_radius_m
+    )
+  ),
+  their_foods AS (
+    SELECT f.*
+    FROM foods f
+    JOIN nearby n ON n.id = f.user_id
+    WHERE f.is_available = TRUE
+  ),
+  my_foods AS (
+    SELECT f.*
+    FROM foods f
+    WHERE f.user_id = p_user_id
+    AND f.is_available = TRUE
+  )
+  SELECT to_jsonb(mf), to_jsonb(tf)
+  FROM my_foods mf
+  CROSS JOIN their_foods tf
+  ORDER BY tf.created_at DESC, mf.created_at DESC
+  LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
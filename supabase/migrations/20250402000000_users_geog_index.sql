@@ -0,0 +1,51 @@
+-- Store the user's location as a geography point so radius searches can use an index
+ALTER TABLE users
+ADD COLUMN IF NOT EXISTS geog geography(Point, 4326)
+GENERATED ALWAYS AS (
+  ST_SetSRID(ST_MakePoint(
+    (location->>'longitude')::float,
+    (location->>'latitude')::float
+  ), 4326)::geography
+) STORED;
+
+-- Add spatial index for ST_DWithin lookups
+CREATE INDEX IF NOT EXISTS users_geog_gix
+ON users USING GIST (geog);
+
+-- Search on the indexed column instead of rebuilding a point per row
+CREATE OR REPLACE FUNCTION get_nearby_swap_candidates(
+  p_user_id UUID,
+  p_radius_m FLOAT,
+  p_limit INTEGER DEFAULT 100
+)
+RETURNS TABLE (requester_food JSONB, provider_food JSONB) AS $$
+  WITH me AS (
+    SELECT geog
+    FROM users
+    WHERE id = p_user_id
+    AND geog IS NOT NULL
+  ),
+  nearby AS (
+    SELECT u.id
+    FROM users u, me
+    WHERE u.id <> p_user_id
+    AND ST_DWithin(u.geog, me.geog, p_radius_m)
+  ),
+  their_foods AS (
+    SELECT f.*
+    FROM foods f
+    JOIN nearby n ON n.id = f.user_id
+    WHERE f.is_available = TRUE
+  ),
+  my_foods AS (
+    SELECT f.*
+    FROM foods f
+    WHERE f.user_id = p_user_id
+    AND f.is_available = TRUE
+  )
+  SELECT to_jsonb(mf), to_jsonb(tf)
+  FROM my_foods mf
+  CROSS JOIN their_foods tf
+  ORDER BY tf.created_at DESC, mf.created_at DESC
+  LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
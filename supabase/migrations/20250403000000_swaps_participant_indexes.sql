@@ -0,0 +1,6 @@
+-- Add indexes for listing a user's swaps as requester or provider
+CREATE INDEX IF NOT EXISTS idx_swaps_requester_id
+ON swaps(requester_id);
+
+CREATE INDEX IF NOT EXISTS idx_swaps_provider_id
+ON swaps(provider_id);
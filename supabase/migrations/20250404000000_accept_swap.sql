@@ -0,0 +1,30 @@
+-- Accept a pending swap and take both foods off the market in one transaction
+CREATE OR REPLACE FUNCTION accept_swap(
+  p_swap_id UUID,
+  p_response_message TEXT DEFAULT NULL
+)
+RETURNS SETOF swaps AS $$
+DECLARE
+  accepted swaps%ROWTYPE;
+BEGIN
+  UPDATE swaps
+  SET status = 'accepted',
+      response_message = COALESCE(p_response_message, response_message),
+      updated_at = NOW()
+  WHERE id = p_swap_id
+  AND status = 'pending'
+  RETURNING * INTO accepted;
+
+  -- The swap is missing or no longer pending, so leave the foods alone
+  IF NOT FOUND THEN
+    RETURN;
+  END IF;
+
+  UPDATE foods
+  SET is_available = FALSE,
+      updated_at = NOW()
+  WHERE id IN (accepted.requester_food_id, accepted.provider_food_id);
+
+  RETURN NEXT accepted;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,16 @@
+-- Add composite indexes matching how swaps are listed: by participant,
+-- optionally by status, newest first
+CREATE INDEX IF NOT EXISTS swaps_requester_status_idx
+ON swaps(requester_id, status, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS swaps_provider_status_idx
+ON swaps(provider_id, status, created_at DESC);
+
+-- The composites lead with the same columns, so the single-column indexes are redundant
+DROP INDEX IF EXISTS idx_swaps_requester_id;
+DROP INDEX IF EXISTS idx_swaps_provider_id;
+
+-- Add partial index for looking up a user's available foods
+CREATE INDEX IF NOT EXISTS foods_user_available_idx
+ON foods(user_id)
+WHERE is_available;
@@ -0,0 +1,53 @@
+-- Page through nearby swap candidates with a keyset cursor. The arguments
+-- change, so drop the old function instead of adding an overload.
+DROP FUNCTION IF EXISTS get_nearby_swap_candidates(UUID, FLOAT, INTEGER);
+
+-- Candidates come newest provider food first; the p_after_* arguments are
+-- the sort key of the last candidate of the previous page
+CREATE OR REPLACE FUNCTION get_nearby_swap_candidates(
+  p_user_id UUID,
+  p_radius_m FLOAT,
+  p_limit INTEGER DEFAULT 100,
+  p_after_provider_created_at TIMESTAMPTZ DEFAULT NULL,
+  p_after_provider_food_id UUID DEFAULT NULL,
+  p_after_requester_created_at TIMESTAMPTZ DEFAULT NULL,
+  p_after_requester_food_id UUID DEFAULT NULL
+)
+RETURNS TABLE (requester_food JSONB, provider_food JSONB) AS $$
+  WITH me AS (
+    SELECT geog
+    FROM users
+    WHERE id = p_user_id
+    AND geog IS NOT NULL
+  ),
+  nearby AS (
+    SELECT u.id
+    FROM users u, me
+    WHERE u.id <> p_user_id
+    AND ST_DWithin(u.geog, me.geog, p_radius_m)
+  ),
+  their_foods AS (
+    SELECT f.*
+    FROM foods f
+    JOIN nearby n ON n.id = f.user_id
+    WHERE f.is_available = TRUE
+  ),
+  my_foods AS (
+    SELECT f.*
+    FROM foods f
+    WHERE f.user_id = p_user_id
+    AND f.is_available = TRUE
+  )
+  SELECT to_jsonb(mf), to_jsonb(tf)
+  FROM my_foods mf
+  CROSS JOIN their_foods tf
+  WHERE p_after_provider_food_id IS NULL
+  OR (tf.created_at, tf.id, mf.created_at, mf.id) < (
+    p_after_provider_created_at,
+    p_after_provider_food_id,
+    p_after_requester_created_at,
+    p_after_requester_food_id
+  )
+  ORDER BY tf.created_at DESC, tf.id DESC, mf.created_at DESC, mf.id DESC
+  LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
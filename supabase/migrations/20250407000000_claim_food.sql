@@ -0,0 +1,97 @@
+-- One balance row per user, needed for the upserts below
+CREATE UNIQUE INDEX IF NOT EXISTS ix_tb_user
+ON ticket_balances(user_id);
+
+-- Claim a food with tickets in one transaction: check the food, debit the
+-- claimer, credit the provider, and record the transactions and the claim.
+-- Failed checks return {"error": ...} instead of raising, so the API can
+-- answer with the matching status code.
+CREATE OR REPLACE FUNCTION claim_food(
+  p_food_id UUID,
+  p_user_id UUID
+)
+RETURNS JSONB AS $$
+DECLARE
+  claimed foods%ROWTYPE;
+  tickets INTEGER;
+  remaining INTEGER;
+  available INTEGER;
+BEGIN
+  -- Lock the food so concurrent claims of it wait for this one
+  SELECT * INTO claimed
+  FROM foods
+  WHERE id = p_food_id
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RETURN jsonb_build_object('error', 'food_not_found');
+  END IF;
+
+  IF NOT claimed.is_available THEN
+    RETURN jsonb_build_object('error', 'food_unavailable');
+  END IF;
+
+  IF claimed.user_id = p_user_id THEN
+    RETURN jsonb_build_object('error', 'own_food');
+  END IF;
+
+  tickets := COALESCE(claimed.tickets_required, 1);
+
+  -- Give a user without a balance their initial tickets
+  WITH created AS (
+    INSERT INTO ticket_balances (user_id, balance, last_updated)
+    VALUES (p_user_id, 5, NOW())
+    ON CONFLICT (user_id) DO NOTHING
+    RETURNING user_id
+  )
+  INSERT INTO ticket_transactions (user_id, amount, transaction_type, description, created_at)
+  SELECT user_id, 5, 'initial', 'Initial ticket allocation', NOW()
+  FROM created;
+
+  -- Debit the claimer only if their balance covers the food
+  UPDATE ticket_balances
+  SET balance = balance - tickets,
+      last_updated = NOW()
+  WHERE user_id = p_user_id
+  AND balance >= tickets
+  RETURNING balance INTO remaining;
+
+  IF NOT FOUND THEN
+    SELECT balance INTO available
+    FROM ticket_balances
+    WHERE user_id = p_user_id;
+
+    RETURN jsonb_build_object(
+      'error', 'insufficient_tickets',
+      'required', tickets,
+      'available', available
+    );
+  END IF;
+
+  UPDATE foods
+  SET is_available = FALSE,
+      updated_at = NOW()
+  WHERE id = p_food_id;
+
+  INSERT INTO ticket_transactions (user_id, amount, transaction_type, related_food_id, description, created_at)
+  VALUES
+    (p_user_id, -tickets, 'spent', p_food_id, 'Claimed food: ' || claimed.title, NOW()),
+    (claimed.user_id, tickets, 'earned', p_food_id, 'Someone claimed your food: ' || claimed.title, NOW());
+
+  -- Credit the provider, creating their balance if needed
+  INSERT INTO ticket_balances (user_id, balance, last_updated)
+  VALUES (claimed.user_id, tickets, NOW())
+  ON CONFLICT (user_id) DO UPDATE
+  SET balance = ticket_balances.balance + EXCLUDED.balance,
+      last_updated = EXCLUDED.last_updated;
+
+  INSERT INTO food_claims (food_id, claimer_id, provider_id, tickets_spent, status, created_at, updated_at)
+  VALUES (p_food_id, p_user_id, claimed.user_id, tickets, 'claimed', NOW(), NOW());
+
+  RETURN jsonb_build_object(
+    'title', claimed.title,
+    'tickets_spent', tickets,
+    'new_balance', remaining
+  );
+END;
+$$ LANGUAGE plpgsql;
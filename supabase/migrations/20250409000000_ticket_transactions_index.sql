@@ -0,0 +1,8 @@
+-- Add composite index matching how transactions are listed: per user, newest first
+CREATE INDEX IF NOT EXISTS ix_tt_user_created
+ON ticket_transactions(user_id, created_at DESC);
+
+-- Add partial index for browsing available foods
+CREATE INDEX IF NOT EXISTS ix_foods_available
+ON foods(is_available)
+WHERE is_available;
@@ -0,0 +1,16 @@
+-- One users row per email, so concurrent registrations of the same address
+-- cannot both insert. Skipped when a unique index on email already exists.
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1
+    FROM pg_index i
+    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+    WHERE i.indrelid = 'public.users'::regclass
+    AND i.indisunique
+    AND i.indnatts = 1
+    AND a.attname = 'email'
+  ) THEN
+    CREATE UNIQUE INDEX users_email_key ON public.users(email);
+  END IF;
+END $$;
@@ -0,0 +1,4 @@
+-- Add partial index for picking a verified user (/users/dev/token)
+CREATE INDEX IF NOT EXISTS ix_users_verified
+ON users(id)
+WHERE is_verified;
@@ -0,0 +1,4 @@
+-- New users authenticate through Supabase Auth only and have no local hash.
+-- Existing hashes are kept for the login fallback.
+ALTER TABLE users
+ALTER COLUMN password DROP NOT NULL;